@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import time
+import tracemalloc
+from datetime import datetime
+
+# ---------------- PATH FIX ----------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
+
+from models.payment_event import (
+    PaymentEvent, InvalidPaymentEvent, ALLOWED_CURRENCIES, MIN_AMOUNT, MAX_AMOUNT, KEY_PATTERN
+)
+
+N = int(os.getenv("BENCH_EVENTS", 100000))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", 5))
+
+BODY = json.dumps({
+    "idempotency_key": "bench-key-000001",
+    "amount": 99.99,
+    "currency": "USD",
+    "user_id": "user-bench",
+    "timestamp": "2024-01-01T00:00:00Z",
+    "metadata": {
+        "source": "bench",
+        "simulate_transient_failure": False,
+        "simulate_permanent_failure": False
+    }
+}).encode()
+
+
+# ---------------- Old dict path ----------------
+def dict_path(body):
+    return _dict_work(json.loads(body))
+
+
+def _dict_work(event):
+    key = event["idempotency_key"]
+    event.get("metadata", {}).get("simulate_transient_failure", False)
+    event.get("metadata", {}).get("simulate_permanent_failure", False)
+    return event, {
+        "idempotency_key": key,
+        "amount": event["amount"],
+        "currency": event["currency"],
+        "user_id": event["user_id"],
+        "status": "PROCESSING",
+        "retry_count": 0,
+        "last_error_message": None,
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+
+
+# ---------------- Old dict path + the same validation ----------------
+# The fair baseline: the dict path validated nothing, so any validating
+# decoder costs more than it. This is what validating the raw dict costs.
+def dict_validated_path(body):
+    event = json.loads(body)
+    key = event.get("idempotency_key")
+    if not isinstance(key, str) or not KEY_PATTERN.fullmatch(key):
+        raise InvalidPaymentEvent("key")
+    amount = event.get("amount")
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)):
+        raise InvalidPaymentEvent("amount")
+    if not MIN_AMOUNT <= amount <= MAX_AMOUNT:
+        raise InvalidPaymentEvent("amount")
+    currency = event.get("currency")
+    if not isinstance(currency, str) or currency.upper() not in ALLOWED_CURRENCIES:
+        raise InvalidPaymentEvent("currency")
+    user_id = event.get("user_id")
+    if not isinstance(user_id, str) or not user_id:
+        raise InvalidPaymentEvent("user_id")
+    metadata = event.get("metadata")
+    if metadata is not None and not isinstance(metadata, dict):
+        raise InvalidPaymentEvent("metadata")
+    return _dict_work(event)
+
+
+# ---------------- PaymentEvent path ----------------
+def event_path(body):
+    event = PaymentEvent.from_dict(json.loads(body))
+    event.simulate_transient_failure
+    event.simulate_permanent_failure
+    return event, event.to_document("PROCESSING")
+
+
+def bench(name, fn):
+    # Best of ROUNDS to damp scheduler noise
+    elapsed = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(N):
+            fn(BODY)
+        elapsed = min(elapsed, time.perf_counter() - start)
+
+    # Retained size of the decoded events (what sits in memory per message)
+    tracemalloc.start()
+    held = [fn(BODY)[0] for _ in range(10000)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+
+    print(
+        f"{name:<15} {N / elapsed:>10.0f} msg/s  "
+        f"{elapsed / N * 1e6:>6.2f} us/msg  {size / 10000:>7.0f} B/event"
+    )
+
+
+if __name__ == "__main__":
+    print(f"--- {N} events, best of {ROUNDS} ---")
+    bench("dict", dict_path)
+    bench("dict+validate", dict_validated_path)
+    bench("PaymentEvent", event_path)
@@ -6,13 +6,20 @@ import time
 import logging
 import pika
 from prometheus_client import start_http_server
-from flask import Flask, jsonify
+from datetime import datetime
+from flask import Flask, jsonify, request
 
 # ---------------- PATH FIX ----------------
 sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
 
-from metrics import messages_consumed, payments_successful, payments_failed, retries_total
+from metrics import REGISTRY, messages_consumed, payments_successful, payments_failed, retries_total
+from telemetry import PipelineTelemetry
+from services.priority_router import PriorityRouter
+from services.retry_delay import declare_retry_queue, publish_retry, retry_queue_name
 from services.payment_service import PaymentService, TransientError, PermanentError
+from models.payment_event import PaymentEvent
+from models.payment_aggregates import PaymentAggregates
+from models.payment_outbox import PaymentOutbox
 from repository.mongo_repo import PaymentRepository
 
 # ---------------- Logging ----------------
@@ -25,11 +32,9 @@ logging.basicConfig(
 # ---------------- Metrics Server ----------------
 def start_metrics():
     port = int(os.getenv("SERVICE_PORT_METRICS", 8001))
-    start_http_server(port)
+    start_http_server(port, registry=REGISTRY)
     logging.info(f"Prometheus metrics running on :{port}")
 
-threading.Thread(target=start_metrics, daemon=True).start()
-
 # ---------------- Health Endpoint ----------------
 app = Flask(__name__)
 @app.route("/health")
@@ -37,11 +42,31 @@ def health():
     return jsonify({"status": "healthy"}), 200
 
 # NOTE: Removed the Flask thread start line
-# Health endpoint will be served via Gunicorn in production
+# Health and aggregates endpoints are served via Gunicorn (consumer:app);
+# importing this module must not start consuming - see __main__ below.
 
 # ---------------- Repository & Service ----------------
 repo = PaymentRepository()
-service = PaymentService(repo)
+aggregates = PaymentAggregates(repo.db)
+service = PaymentService(repo, aggregates, PaymentOutbox(repo.db))
+
+# ---------------- Aggregates Endpoint ----------------
+# GET /aggregates?user_id=&currency=&status=COMPLETED&from=<iso>&to=<iso>
+@app.route("/aggregates")
+def get_aggregates():
+    try:
+        start = request.args.get("from")
+        end = request.args.get("to")
+        result = aggregates.query(
+            user_id=request.args.get("user_id"),
+            currency=request.args.get("currency"),
+            status=request.args.get("status", "COMPLETED"),
+            start=datetime.fromisoformat(start) if start else None,
+            end=datetime.fromisoformat(end) if end else None
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result), 200
 
 # Ensure unique index on idempotency_key
 repo.collection.create_index("idempotency_key", unique=True)
@@ -53,94 +78,151 @@ MQ_USER = os.getenv("MQ_USER", "guest")
 MQ_PASS = os.getenv("MQ_PASS", "guest")
 QUEUE = os.getenv("PAYMENT_INITIATION_QUEUE", "payment_initiation")
 DLQ = os.getenv("PAYMENT_DLQ", "payment_dlq")
+TELEMETRY_INTERVAL = float(os.getenv("TELEMETRY_SAMPLE_INTERVAL_SECONDS", 15))
 MAX_RETRIES = int(os.getenv("PAYMENT_RETRY_LIMIT", 3))
 INITIAL_DELAY = int(os.getenv("PAYMENT_RETRY_INITIAL_DELAY_SECONDS", 2))
 
 credentials = pika.PlainCredentials(MQ_USER, MQ_PASS)
-connection = pika.BlockingConnection(
-    pika.ConnectionParameters(host=MQ_HOST, port=MQ_PORT, credentials=credentials)
-)
-channel = connection.channel()
-channel.queue_declare(queue=QUEUE, durable=True)
-channel.queue_declare(queue=DLQ, durable=True)
+connection_params = pika.ConnectionParameters(host=MQ_HOST, port=MQ_PORT, credentials=credentials)
 
 # ---------------- Helper ----------------
 def backoff(retry):
     return INITIAL_DELAY * (2 ** retry)
 
-# ---------------- Consumer Callback ----------------
-def callback(ch, method, properties, body):
+def send_to_dlq(ch, body):
+    ch.basic_publish(
+        exchange="",
+        routing_key=DLQ,
+        body=body,
+        properties=pika.BasicProperties(delivery_mode=2)
+    )
+
+def mark_failed(event):
+    # RETRYING -> FAILED writes the PaymentFailed outbox entry; the DLQ
+    # publish must still happen if MongoDB is unavailable
     try:
-        event = json.loads(body)
-    except json.JSONDecodeError:
-        logging.error("Failed to decode message, sending to DLQ")
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-        channel.basic_publish(
-            exchange="",
-            routing_key=DLQ,
-            body=body,
-            properties=pika.BasicProperties(delivery_mode=2)
-        )
-        return
+        service.fail_payment(event, f"Retries exhausted after {MAX_RETRIES} attempts")
+    except Exception:
+        logging.exception(f"[!] Could not mark key={event.idempotency_key} FAILED")
 
-    messages_consumed.inc()
-    retry_count = properties.headers.get("x-retry-count", 0) if properties.headers else 0
+# ---------------- Consumer Callback ----------------
+def make_callback(lane, queue, telemetry):
+    def callback(ch, method, properties, body):
+        telemetry.record_delivery(queue)
+        try:
+            event = PaymentEvent.from_dict(json.loads(body))
+        except ValueError as e:
+            # Bad JSON, non-UTF-8 bytes (UnicodeDecodeError) or InvalidPaymentEvent;
+            # rejected before any DB access
+            payments_failed.inc()
+            logging.error(f"Invalid message, sending to DLQ: {e}")
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            send_to_dlq(ch, body)
+            return
+
+        messages_consumed.inc()
+        retry_count = properties.headers.get("x-retry-count", 0) if properties.headers else 0
+
+        try:
+            service.process_payment(event)
+            payments_successful.inc()
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            telemetry.observe_completion(event.timestamp, "success", lane)
+            logging.info(f"[✓] Processed payment | lane={lane} | key={event.idempotency_key}")
+
+        except TransientError:
+            retries_total.inc()
+            if retry_count < MAX_RETRIES:
+                delay = backoff(retry_count)
+                logging.warning(f"[~] Retry {event.idempotency_key} in {delay}s")
+                # Parked in the lane's delay queue, which dead-letters it back
+                # into this lane; the consumer moves straight on to the next message
+                publish_retry(ch, queue, delay, body, {"x-retry-count": retry_count + 1})
+            else:
+                payments_failed.inc()
+                telemetry.observe_completion(event.timestamp, "dlq", lane)
+                logging.error(f"[X] Max retries reached, sending to DLQ | key={event.idempotency_key}")
+                mark_failed(event)
+                send_to_dlq(ch, body)
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+
+        except PermanentError:
+            payments_failed.inc()
+            telemetry.observe_completion(event.timestamp, "dlq", lane)
+            logging.error(f"[X] Permanent failure, sending to DLQ | key={event.idempotency_key}")
+            send_to_dlq(ch, body)
+            ch.basic_ack(delivery_tag=method.delivery_tag)
 
+        except Exception as e:
+            logging.exception(f"[!] Unexpected error for key={event.idempotency_key}: {e}")
+            telemetry.observe_completion(event.timestamp, "error", lane)
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            send_to_dlq(ch, body)
+
+    return callback
+
+# ---------------- Start Consuming ----------------
+# Every lane consumer has its own connection (pika connections are not
+# thread-safe), so capacity reserved for a lane is never borrowed by another.
+def consume_lane(lane, queue, telemetry):
     try:
-        service.process_payment(event)
-        payments_successful.inc()
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-        logging.info(f"[✓] Processed payment | key={event['idempotency_key']}")
-
-    except TransientError:
-        retries_total.inc()
-        if retry_count < MAX_RETRIES:
-            delay = backoff(retry_count)
-            logging.warning(f"[~] Retry {event['idempotency_key']} in {delay}s")
-            time.sleep(delay)
-            channel.basic_publish(
-                exchange="",
-                routing_key=QUEUE,
-                body=json.dumps(event),
-                properties=pika.BasicProperties(
-                    delivery_mode=2,
-                    headers={"x-retry-count": retry_count + 1}
-                )
-            )
-        else:
-            payments_failed.inc()
-            logging.error(f"[X] Max retries reached, sending to DLQ | key={event['idempotency_key']}")
-            channel.basic_publish(
-                exchange="",
-                routing_key=DLQ,
-                body=json.dumps(event),
-                properties=pika.BasicProperties(delivery_mode=2)
+        while True:
+            try:
+                _consume_lane(lane, queue, telemetry)
+            except pika.exceptions.AMQPConnectionError as e:
+                # Broker restart / network blip: reconnect like MQConsumer does
+                logging.warning(f"RabbitMQ connection lost for lane={lane} ({e}), reconnecting in 5 seconds...")
+                time.sleep(5)
+    except Exception:
+        # Same as the single-consumer days: a dead consumer takes the process down
+        logging.exception(f"[!] Consumer for lane={lane} stopped")
+        os._exit(1)
+
+def _consume_lane(lane, queue, telemetry):
+    connection = pika.BlockingConnection(connection_params)
+    channel = connection.channel()
+    channel.queue_declare(queue=queue, durable=True)
+    channel.queue_declare(queue=DLQ, durable=True)
+    for retry in range(MAX_RETRIES):
+        declare_retry_queue(channel, queue, backoff(retry))
+    channel.basic_qos(prefetch_count=1)
+    channel.basic_consume(queue=queue, on_message_callback=make_callback(lane, queue, telemetry))
+    logging.info(f"[*] Waiting for messages on queue: {queue} (lane={lane})")
+    channel.start_consuming()
+
+def main():
+    threading.Thread(target=start_metrics, daemon=True).start()
+
+    # ---------------- Priority Lanes ----------------
+    router = PriorityRouter.from_env(QUEUE)
+    lane_queues = [router.queue_for(lane) for lane in router.lanes()]
+
+    # ---------------- Telemetry ----------------
+    telemetry = PipelineTelemetry(
+        connection_params,
+        consumed_queues=lane_queues,
+        observed_queues=[DLQ] + [
+            retry_queue_name(q, backoff(retry))
+            for q in lane_queues for retry in range(MAX_RETRIES)
+        ],
+        interval=TELEMETRY_INTERVAL,
+        local_consumers={router.queue_for(lane): n for lane, n in router.lane_consumers.items()}
+    )
+    telemetry.start()
+
+    lane_threads = []
+    for lane, consumers in router.lane_consumers.items():
+        for _ in range(consumers):
+            t = threading.Thread(
+                target=consume_lane,
+                args=(lane, router.queue_for(lane), telemetry),
+                daemon=True
             )
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-
-    except PermanentError:
-        payments_failed.inc()
-        logging.error(f"[X] Permanent failure, sending to DLQ | key={event['idempotency_key']}")
-        channel.basic_publish(
-            exchange="",
-            routing_key=DLQ,
-            body=json.dumps(event),
-            properties=pika.BasicProperties(delivery_mode=2)
-        )
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-
-    except Exception as e:
-        logging.exception(f"[!] Unexpected error for key={event.get('idempotency_key', 'unknown')}: {e}")
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-        channel.basic_publish(
-            exchange="",
-            routing_key=DLQ,
-            body=json.dumps(event),
-            properties=pika.BasicProperties(delivery_mode=2)
-        )
+            t.start()
+            lane_threads.append(t)
 
-# ---------------- Start Consuming ----------------
-channel.basic_qos(prefetch_count=1)
-channel.basic_consume(queue=QUEUE, on_message_callback=callback)
-logging.info(f"[*] Waiting for messages on queue: {QUEUE}")
-channel.start_consuming()
+    for t in lane_threads:
+        t.join()
+
+if __name__ == "__main__":
+    main()
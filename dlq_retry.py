@@ -2,6 +2,13 @@ import pika
 import json
 import time
 import os
+import sys
+
+# ---------------- PATH FIX ----------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
+
+from models.payment_event import PaymentEvent
+from services.priority_router import PriorityRouter
 
 # ---------------- RabbitMQ ----------------
 MQ_HOST = os.getenv("MQ_HOST", "rabbitmq")
@@ -17,34 +24,38 @@ connection = pika.BlockingConnection(
     pika.ConnectionParameters(host=MQ_HOST, port=MQ_PORT, credentials=credentials)
 )
 channel = connection.channel()
-channel.queue_declare(queue=QUEUE, durable=True)
 channel.queue_declare(queue=DLQ, durable=True)
 
+router = PriorityRouter.from_env(QUEUE)
+for lane in router.lanes():
+    channel.queue_declare(queue=router.queue_for(lane), durable=True)
+
 # ---------------- DLQ Consumer ----------------
 def callback(ch, method, properties, body):
     try:
-        event = json.loads(body)
-    except json.JSONDecodeError:
+        event = PaymentEvent.from_dict(json.loads(body))
+    except ValueError:
+        # Bad JSON, non-UTF-8 bytes (UnicodeDecodeError) or InvalidPaymentEvent:
+        # the consumers forward all of these here, none of them can be retried
         print("Invalid message in DLQ, skipping")
         ch.basic_ack(delivery_tag=method.delivery_tag)
         return
 
     # Check if this was a transient failure
-    metadata = event.get("metadata", {})
-    if metadata.get("simulate_transient_failure", False):
-        print(f"[~] Retrying transient failure: {event['idempotency_key']} after {RETRY_DELAY}s")
+    if event.simulate_transient_failure:
+        print(f"[~] Retrying transient failure: {event.idempotency_key} after {RETRY_DELAY}s")
         time.sleep(RETRY_DELAY)
         channel.basic_publish(
             exchange="",
-            routing_key=QUEUE,
-            body=json.dumps(event),
+            routing_key=router.route(event),
+            body=body,
             properties=pika.BasicProperties(
                 delivery_mode=2,
                 headers={"x-retry-count": 0}  # reset retry count
             )
         )
     else:
-        print(f"[X] Permanent failure, leaving in DLQ: {event['idempotency_key']}")
+        print(f"[X] Permanent failure, leaving in DLQ: {event.idempotency_key}")
 
     ch.basic_ack(delivery_tag=method.delivery_tag)
 
@@ -0,0 +1,163 @@
+import os
+import sys
+import json
+import time
+import logging
+from datetime import datetime, timedelta
+import pika
+from pymongo.errors import PyMongoError
+from prometheus_client import start_http_server
+
+# ---------------- PATH FIX ----------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
+
+from metrics import REGISTRY, outbox_lag_seconds, outbox_pending, outbox_published, outbox_orphaned
+from models.payment_outbox import PaymentOutbox, PUBLISHED, ORPHANED
+from repository.mongo_repo import PaymentRepository
+
+# ---------------- Logging ----------------
+logging.basicConfig(
+    level=logging.INFO,
+    format="[%(asctime)s] %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+# ---------------- Config ----------------
+MQ_HOST = os.getenv("MQ_HOST", "rabbitmq")
+MQ_PORT = int(os.getenv("MQ_PORT", 5672))
+MQ_USER = os.getenv("MQ_USER", "guest")
+MQ_PASS = os.getenv("MQ_PASS", "guest")
+RESULTS_EXCHANGE = os.getenv("PAYMENT_RESULTS_EXCHANGE", "payment_results")
+BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 500))
+POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL_SECONDS", 1))
+ORPHAN_GRACE = int(os.getenv("OUTBOX_ORPHAN_GRACE_SECONDS", 60))
+METRICS_PORT = int(os.getenv("OUTBOX_RELAY_METRICS_PORT", 8003))
+
+
+def connect():
+    credentials = pika.PlainCredentials(MQ_USER, MQ_PASS)
+    connection = pika.BlockingConnection(
+        pika.ConnectionParameters(host=MQ_HOST, port=MQ_PORT, credentials=credentials)
+    )
+    channel = connection.channel()
+    channel.exchange_declare(exchange=RESULTS_EXCHANGE, exchange_type="topic", durable=True)
+    # AMQP transaction: the whole batch is confirmed by a single tx_commit
+    channel.tx_select()
+    return connection, channel
+
+
+# ---------------- Relay ----------------
+def split_confirmed(transactions, entries):
+    """
+    An entry is publishable once its status update has landed: the
+    transaction is in exactly the entry's status, written no earlier than the
+    entry. A later write alone (e.g. RETRYING after a lost FAILED update)
+    does not confirm it. The rest are either still in flight or orphaned once
+    older than the grace period.
+    """
+    keys = [e["event"]["idempotency_key"] for e in entries]
+    current = {
+        doc["idempotency_key"]: doc
+        for doc in transactions.find(
+            {"idempotency_key": {"$in": keys}},
+            {"idempotency_key": 1, "status": 1, "updated_at": 1}
+        )
+    }
+
+    orphan_before = datetime.utcnow() - timedelta(seconds=ORPHAN_GRACE)
+    confirmed, orphaned = [], []
+    for entry in entries:
+        txn = current.get(entry["event"]["idempotency_key"])
+        if (
+            txn is not None
+            and txn.get("status") == entry["event"]["status"]
+            and txn["updated_at"] >= entry["created_at"]
+        ):
+            confirmed.append(entry)
+        elif entry["created_at"] < orphan_before:
+            orphaned.append(entry)
+    return confirmed, orphaned
+
+
+def relay_batch(channel, outbox, transactions):
+    entries = outbox.fetch_pending(BATCH_SIZE)
+    if not entries:
+        return 0
+
+    confirmed, orphaned = split_confirmed(transactions, entries)
+
+    for entry in confirmed:
+        event = entry["event"]
+        channel.basic_publish(
+            exchange=RESULTS_EXCHANGE,
+            routing_key=f"payment.{event['status'].lower()}",
+            body=json.dumps(event),
+            properties=pika.BasicProperties(
+                delivery_mode=2,
+                message_id=entry["_id"],  # lets consumers dedupe redeliveries
+                content_type="application/json"
+            )
+        )
+    if confirmed:
+        channel.tx_commit()
+
+    # A crash between commit and mark re-publishes the batch (at-least-once)
+    outbox_published.inc(outbox.mark([e["_id"] for e in confirmed], PUBLISHED))
+
+    if orphaned:
+        logging.warning(f"[X] Dropping {len(orphaned)} orphaned outbox entries")
+        outbox_orphaned.inc(outbox.mark([e["_id"] for e in orphaned], ORPHANED))
+
+    return len(confirmed)
+
+
+def update_lag(outbox):
+    oldest = outbox.oldest_pending_at()
+    outbox_lag_seconds.set(
+        (datetime.utcnow() - oldest).total_seconds() if oldest else 0
+    )
+    outbox_pending.set(outbox.pending_count())
+
+
+def run():
+    start_http_server(METRICS_PORT, registry=REGISTRY)
+    logging.info(f"Prometheus metrics running on :{METRICS_PORT}")
+
+    # ---------------- Dependencies ----------------
+    repo = PaymentRepository()
+    outbox = PaymentOutbox(repo.db)
+
+    connection, channel = None, None
+    while True:
+        try:
+            if connection is None or connection.is_closed:
+                connection, channel = connect()
+                logging.info(f"[*] Relaying outbox to exchange: {RESULTS_EXCHANGE}")
+
+            published = relay_batch(channel, outbox, repo.collection)
+            update_lag(outbox)
+            if published:
+                logging.info(f"[✓] Published {published} result events")
+            if published < BATCH_SIZE:
+                time.sleep(POLL_INTERVAL)
+
+        except pika.exceptions.AMQPError as e:
+            logging.warning(f"RabbitMQ unavailable ({e}), retrying in 5 seconds...")
+            connection = None
+            time.sleep(5)
+
+        except PyMongoError as e:
+            # e.g. server selection timeout during a MongoDB restart. Entries
+            # stay PENDING; an uncommitted AMQP batch is rolled back with the
+            # channel, a committed but unmarked one is re-published (at-least-once).
+            logging.warning(f"MongoDB unavailable ({e}), retrying in 5 seconds...")
+            if connection is not None and connection.is_open:
+                try:
+                    channel.tx_rollback()
+                except pika.exceptions.AMQPError:
+                    connection = None
+            time.sleep(5)
+
+
+if __name__ == "__main__":
+    run()
@@ -1,8 +1,16 @@
+import os
+import sys
 import pika
 import json
 import uuid
 from datetime import datetime
 
+# ---------------- PATH FIX ----------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
+
+from models.payment_event import PaymentEvent
+from services.priority_router import PriorityRouter
+
 # ---------------------------
 # RabbitMQ Configuration
 # ---------------------------
@@ -27,8 +35,10 @@ connection = pika.BlockingConnection(
 
 channel = connection.channel()
 
-# Ensure queue exists
-channel.queue_declare(queue=PAYMENT_QUEUE, durable=True)
+# Ensure every priority lane queue exists
+router = PriorityRouter.from_env(PAYMENT_QUEUE)
+for lane in router.lanes():
+    channel.queue_declare(queue=router.queue_for(lane), durable=True)
 
 # ---------------------------
 # Publish Payment Event
@@ -39,7 +49,8 @@ def publish_payment_event(
     user_id,
     idempotency_key=None,
     simulate_transient_failure=False,
-    simulate_permanent_failure=False
+    simulate_permanent_failure=False,
+    priority=None
 ):
     if not idempotency_key:
         idempotency_key = str(uuid.uuid4())
@@ -56,10 +67,14 @@ def publish_payment_event(
             "simulate_permanent_failure": simulate_permanent_failure
         }
     }
+    if priority:
+        event["metadata"]["priority"] = priority
+
+    queue = router.route(PaymentEvent.from_dict(event))
 
     channel.basic_publish(
         exchange="",
-        routing_key=PAYMENT_QUEUE,
+        routing_key=queue,
         body=json.dumps(event),
         properties=pika.BasicProperties(
             delivery_mode=2  # make message persistent
@@ -67,7 +82,7 @@ def publish_payment_event(
     )
 
     print(
-        f"[x] Sent payment | key={idempotency_key} | "
+        f"[x] Sent payment | key={idempotency_key} | queue={queue} | "
         f"{amount} {currency} | "
         f"transient={simulate_transient_failure} | "
         f"permanent={simulate_permanent_failure}"
@@ -100,6 +115,9 @@ publish_payment_event(
     simulate_permanent_failure=True
 )
 
+# 4️⃣ High-value payment (should take the high-priority lane)
+publish_payment_event(10000.0, "USD", "user-delta")
+
 # ---------------------------
 # Close connection
 # ---------------------------
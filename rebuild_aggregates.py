@@ -0,0 +1,21 @@
+import os
+import sys
+import time
+
+# ---------------- PATH FIX ----------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
+
+from repository.mongo_repo import PaymentRepository
+from models.payment_aggregates import PaymentAggregates
+
+# ---------------- Rebuild ----------------
+# Recomputes payment_aggregates from payment_transactions from scratch.
+# Safe to run while consumers are live: the new collection is swapped in
+# atomically; transitions recorded during the rebuild window may be lost,
+# so schedule it off-peak (or run it again) if exact numbers matter.
+repo = PaymentRepository()
+aggregates = PaymentAggregates(repo.db)
+
+start = time.time()
+count = aggregates.rebuild(repo.collection)
+print(f"[✓] Rebuilt {count} aggregate documents in {time.time() - start:.1f}s")
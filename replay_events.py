@@ -0,0 +1,233 @@
+import os
+import sys
+import gzip
+import json
+import time
+import logging
+import argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# ---------------- PATH FIX ----------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
+
+from repository.mongo_repo import PaymentRepository
+from repository.batching_repo import BatchingPaymentRepository
+from models.payment_event import PaymentEvent, InvalidPaymentEvent
+from models.payment_aggregates import PaymentAggregates, BatchedAggregates
+from models.payment_outbox import PaymentOutbox, BatchedOutbox
+from services.payment_service import PaymentService, TransientError, PermanentError
+
+# ---------------- Logging ----------------
+logging.basicConfig(
+    level=logging.INFO,
+    format="[%(asctime)s] %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+MAX_RETRIES = int(os.getenv("PAYMENT_RETRY_LIMIT", 3))
+# Shorter than the consumer's PAYMENT_RETRY_INITIAL_DELAY_SECONDS: only the
+# worker thread waits, and a replay has millions of events to get through
+RETRY_DELAY = float(os.getenv("REPLAY_RETRY_INITIAL_DELAY_SECONDS", 0.5))
+
+# Replay never re-drives a key that already reached one of these states, so
+# replaying a file is a no-op for every key it has seen. FAILED / RETRYING
+# keys (including RETRIES_EXHAUSTED from an earlier replay) are left to the
+# DLQ tooling instead of being re-rolled here; the run that failed them
+# recorded their original lines in the rejects file.
+TERMINAL_STATUSES = ("COMPLETED", "FAILED", "RETRYING")
+REJECTED_RESULTS = ("FAILED", "RETRIES_EXHAUSTED")
+
+
+# ---------------- Input / Checkpoint ----------------
+def open_events(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return int(json.load(f)["offset"])
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path, offset):
+    # Write-then-rename so a crash never leaves a torn checkpoint
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"offset": offset, "updated_at": time.time()}, f)
+    os.replace(tmp, path)
+
+
+def write_rejects(path, rejects):
+    """
+    Append {"reason", "line"} records; synced before the checkpoint moves
+    past them, so a crash can duplicate a reject but never lose one.
+    """
+    if not rejects:
+        return
+    with open(path, "a", encoding="utf-8") as f:
+        for reject in rejects:
+            f.write(json.dumps(reject) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_batches(f, batch_size, start_offset):
+    """Yield (end_offset, lines); offsets are line numbers in the file"""
+    offset = 0
+    batch = []
+    for line in f:
+        offset += 1
+        if offset <= start_offset:
+            continue
+        batch.append(line)
+        if len(batch) >= batch_size:
+            yield offset, batch
+            batch = []
+    if batch:
+        yield offset, batch
+
+
+# ---------------- Processing ----------------
+def process_one(service, event, retry_delay=RETRY_DELAY):
+    """Exponential backoff between attempts, on this worker thread only"""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return service.process_payment(event)
+        except TransientError:
+            if attempt < MAX_RETRIES:
+                time.sleep(retry_delay * (2 ** attempt))
+        except PermanentError:
+            return "FAILED"
+    return "RETRIES_EXHAUSTED"
+
+
+def decode_batch(lines, stats, rejects):
+    """Returns (events, {idempotency_key: original line}); invalid lines go to rejects"""
+    events = []
+    raw = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            event = PaymentEvent.from_dict(json.loads(line))
+        except (ValueError, InvalidPaymentEvent) as e:
+            stats["INVALID"] += 1
+            logging.warning(f"[X] Rejecting invalid event: {e}")
+            rejects.append({"reason": "INVALID", "error": str(e), "line": line})
+            continue
+        if event.idempotency_key in raw:
+            stats["IDEMPOTENT_SKIP"] += 1
+            continue
+        raw[event.idempotency_key] = line
+        events.append(event)
+    return events, raw
+
+
+def skip_terminal(repo, events, stats):
+    """Drop events whose key is already terminal (served from the preload cache)"""
+    pending = []
+    for event in events:
+        doc = repo.find_by_idempotency_key(event.idempotency_key)
+        if doc is None or doc["status"] not in TERMINAL_STATUSES:
+            pending.append(event)
+        elif doc["status"] == "COMPLETED":
+            stats["IDEMPOTENT_SKIP"] += 1
+        else:
+            stats[f"SKIPPED_{doc['status']}"] += 1
+    return pending
+
+
+def report(stats, offset, started):
+    elapsed = max(time.time() - started, 1e-9)
+    total = sum(stats.values())
+    summary = " ".join(f"{k.lower()}={v}" for k, v in sorted(stats.items()))
+    logging.info(
+        f"[*] line={offset} events={total} ({total / elapsed:.0f}/s) {summary}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a JSONL(.gz) file of payment events through PaymentService, bypassing RabbitMQ"
+    )
+    parser.add_argument("path")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--checkpoint", help="defaults to <path>.checkpoint")
+    parser.add_argument("--rejects", help="FAILED / RETRIES_EXHAUSTED / INVALID events; defaults to <path>.rejects.jsonl")
+    parser.add_argument("--retry-delay", type=float, default=RETRY_DELAY,
+                        help="initial transient-retry backoff in seconds, doubled per attempt")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--report-every", type=float, default=5.0, help="seconds between progress lines")
+    args = parser.parse_args()
+
+    checkpoint = args.checkpoint or args.path + ".checkpoint"
+    rejects_path = args.rejects or args.path + ".rejects.jsonl"
+    start_offset = 0 if args.restart else read_checkpoint(checkpoint)
+    if start_offset:
+        logging.info(f"[*] Resuming {args.path} after line {start_offset}")
+
+    base_repo = PaymentRepository()
+    repo = BatchingPaymentRepository(base_repo)
+    aggregates = BatchedAggregates(PaymentAggregates(base_repo.db))
+    outbox = BatchedOutbox(PaymentOutbox(base_repo.db))
+    service = PaymentService(repo, aggregates, outbox)
+
+    stats = Counter()
+    started = time.time()
+    last_report = started
+    offset = start_offset
+
+    with open_events(args.path) as f, ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for offset, lines in read_batches(f, args.batch_size, start_offset):
+            rejects = []
+            events, raw = decode_batch(lines, stats, rejects)
+
+            # One $in lookup per batch; already-seen keys never hit Mongo again
+            repo.preload([e.idempotency_key for e in events])
+            events = skip_terminal(repo, events, stats)
+            failed = {}
+            results = pool.map(lambda e: process_one(service, e, args.retry_delay), events)
+            for event, result in zip(events, results):
+                stats[result] += 1
+                if result in REJECTED_RESULTS:
+                    failed[event.idempotency_key] = result
+
+            # Outbox before the status writes, same as the live consumer
+            outbox.flush()
+            conflicts = repo.flush()
+            if conflicts:
+                # A live consumer moved these keys after the preload: its
+                # transition stands, ours did not happen
+                logging.warning(f"[~] {len(conflicts)} keys changed concurrently, dropping their replay results")
+                aggregates.discard(conflicts)
+                outbox.retract(conflicts)
+            aggregates.flush()
+
+            # Later runs skip these keys as terminal, so record them before
+            # the checkpoint moves past them (lost races are the consumer's)
+            rejects += [
+                {"reason": result, "idempotency_key": key, "line": raw[key]}
+                for key, result in failed.items() if key not in conflicts
+            ]
+            write_rejects(rejects_path, rejects)
+            write_checkpoint(checkpoint, offset)
+
+            if time.time() - last_report >= args.report_every:
+                report(stats, offset, started)
+                last_report = time.time()
+
+    report(stats, offset, started)
+    logging.info(f"[✓] Replay finished, checkpoint at line {offset}")
+    if os.path.exists(rejects_path):
+        logging.info(f"[*] Rejected events are in {rejects_path}")
+
+
+if __name__ == "__main__":
+    main()
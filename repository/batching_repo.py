@@ -0,0 +1,158 @@
+import threading
+from datetime import datetime
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+DUPLICATE_KEY = 11000
+
+
+def _now():
+    # Millisecond precision, as MongoDB stores it, so flush() can recognise
+    # its own writes by updated_at
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+class BatchingPaymentRepository:
+    """
+    Write-behind wrapper around PaymentRepository for bulk ingest.
+
+    Reads are served from a per-batch cache filled by preload() with a single
+    $in query; creates and updates are collapsed per idempotency_key and sent
+    in one unordered bulk_write on flush(). Thread-safe so a worker pool can
+    share one instance.
+
+    Updates are conditional on the status each key had when it was loaded,
+    so a live consumer that moved the key in the meantime wins; flush()
+    reports those keys so their buffered side effects can be dropped.
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.collection = repo.collection
+        self._lock = threading.Lock()
+        self._docs = {}       # key -> latest known document (or None)
+        self._loaded = {}     # key -> status in MongoDB when loaded (the update filter)
+        self._inserts = {}    # key -> document to insert
+        self._updates = {}    # key -> merged $set for an existing document
+
+    def preload(self, keys):
+        missing = [k for k in set(keys) if k not in self._docs]
+        if not missing:
+            return
+        found = {
+            doc["idempotency_key"]: doc
+            for doc in self.collection.find({"idempotency_key": {"$in": missing}})
+        }
+        with self._lock:
+            for key in missing:
+                self._cache(key, found.get(key))
+
+    def find_by_idempotency_key(self, key):
+        with self._lock:
+            if key in self._docs:
+                return self._docs[key]
+        doc = self.repo.find_by_idempotency_key(key)
+        with self._lock:
+            self._cache(key, doc)
+            return self._docs[key]
+
+    def _cache(self, key, doc):
+        # Caller holds self._lock
+        if key in self._docs:
+            return
+        self._docs[key] = doc
+        if doc is not None:
+            self._loaded[key] = doc.get("status")
+
+    def create_transaction(self, transaction):
+        transaction["created_at"] = transaction["updated_at"] = _now()
+        with self._lock:
+            self._docs[transaction["idempotency_key"]] = transaction
+            self._inserts[transaction["idempotency_key"]] = transaction
+        return True
+
+    def update_transaction(self, key, updates):
+        updates["updated_at"] = _now()
+        with self._lock:
+            self._apply(key, updates)
+
+    def transition_status(self, key, old_status, updates):
+        """
+        Checked against the cached document, which every batch preloads, and
+        again in MongoDB on flush()
+        """
+        updates["updated_at"] = _now()
+        with self._lock:
+            doc = self._docs.get(key)
+            if doc is not None and doc.get("status") != old_status:
+                return False
+            self._apply(key, updates)
+            return True
+
+    def _apply(self, key, updates):
+        # Caller holds self._lock
+        if key in self._inserts:
+            # Not written yet: fold the update into the pending insert
+            self._inserts[key].update(updates)
+        else:
+            self._updates.setdefault(key, {}).update(updates)
+        doc = self._docs.get(key)
+        if doc is not None:
+            doc.update(updates)
+
+    def flush(self):
+        """
+        Write pending changes. Returns {key: current status (None if
+        unknown)} for keys whose write lost to another writer: the insert hit
+        a duplicate key, or the status was no longer the one this batch
+        loaded. Everything buffered for those keys (aggregate deltas, outbox
+        entries) describes a transition that did not happen.
+        """
+        with self._lock:
+            inserts, updates, loaded = self._inserts, self._updates, self._loaded
+            self._inserts = {}
+            self._updates = {}
+            self._loaded = {}
+            self._docs = {}
+
+        ops = [InsertOne(doc) for doc in inserts.values()]
+        ops += [
+            UpdateOne({"idempotency_key": key, "status": loaded.get(key)}, {"$set": changes})
+            for key, changes in updates.items()
+        ]
+        if not ops:
+            return {}
+
+        lost = set()
+        try:
+            matched = self.collection.bulk_write(ops, ordered=False).matched_count
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(err.get("code") != DUPLICATE_KEY for err in errors):
+                raise
+            # Another writer inserted the same key first: idempotency holds
+            lost = {err["op"]["idempotency_key"] for err in errors}
+            matched = e.details.get("nMatched", 0)
+
+        # Unordered bulk results only count matches, so find out which
+        # conditional updates missed by looking for our own updated_at
+        suspects = set(lost)
+        if matched < len(updates):
+            suspects.update(updates)
+        if not suspects:
+            return {}
+
+        current = {
+            doc["idempotency_key"]: doc
+            for doc in self.collection.find(
+                {"idempotency_key": {"$in": list(suspects)}},
+                {"idempotency_key": 1, "status": 1, "updated_at": 1}
+            )
+        }
+        conflicts = {}
+        for key in suspects:
+            doc = current.get(key)
+            if key in lost or doc is None or doc.get("updated_at") != updates[key]["updated_at"]:
+                conflicts[key] = doc.get("status") if doc else None
+        return conflicts
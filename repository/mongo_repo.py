@@ -1,5 +1,6 @@
 import os
 from pymongo import MongoClient, ASCENDING
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
 
 class PaymentRepository:
@@ -25,9 +26,14 @@ class PaymentRepository:
         return self.collection.find_one({"idempotency_key": key})
 
     def create_transaction(self, transaction):
+        """False if another delivery of the same key inserted it first"""
         transaction["created_at"] = datetime.utcnow()
         transaction["updated_at"] = datetime.utcnow()
-        self.collection.insert_one(transaction)
+        try:
+            self.collection.insert_one(transaction)
+        except DuplicateKeyError:
+            return False
+        return True
 
     def update_transaction(self, key, updates):
         updates["updated_at"] = datetime.utcnow()
@@ -35,3 +41,12 @@ class PaymentRepository:
             {"idempotency_key": key},
             {"$set": updates}
         )
+
+    def transition_status(self, key, old_status, updates):
+        """Apply updates only if the status is still old_status; True if it was"""
+        updates["updated_at"] = datetime.utcnow()
+        result = self.collection.update_one(
+            {"idempotency_key": key, "status": old_status},
+            {"$set": updates}
+        )
+        return result.matched_count == 1
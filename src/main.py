@@ -1,18 +1,31 @@
 from threading import Thread
 from config import Config
 from models.payment_model import PaymentRepository
+from models.payment_aggregates import PaymentAggregates
+from models.payment_outbox import PaymentOutbox
 from services.payment_service import PaymentService
 from services.message_queue_consumer import MQConsumer
+from services.priority_router import PriorityRouter
 from api.health_metrics import app
 
 
-def start_consumer():
-    repo = PaymentRepository(Config)
-    service = PaymentService(repo)
-    consumer = MQConsumer(service)
+def start_consumer(service, queue):
+    consumer = MQConsumer(service, queue)
     consumer.start()
 
 
 if __name__ == "__main__":
-    Thread(target=start_consumer, daemon=True).start()
+    repo = PaymentRepository(Config)
+    service = PaymentService(repo, PaymentAggregates(repo.db), PaymentOutbox(repo.db))
+
+    # Reserved consumers per priority lane, each with its own connection
+    router = PriorityRouter.from_env(Config.PAYMENT_INITIATION_QUEUE)
+    for lane, consumers in router.lane_consumers.items():
+        for _ in range(consumers):
+            Thread(
+                target=start_consumer,
+                args=(service, router.queue_for(lane)),
+                daemon=True
+            ).start()
+
     app.run(host="0.0.0.0", port=Config.SERVICE_PORT)
@@ -1,4 +1,4 @@
-from prometheus_client import Counter, CollectorRegistry
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry
 
 # Custom registry (NOT the global one)
 REGISTRY = CollectorRegistry()
@@ -26,3 +26,74 @@ retries_total = Counter(
     "Total retries attempted for transient failures",
     registry=REGISTRY
 )
+
+# ---------------- Telemetry ----------------
+
+end_to_end_latency = Histogram(
+    "payment_processor_end_to_end_latency_seconds",
+    "Time from event publish timestamp to processing completion",
+    ["lane", "outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900, 3600),
+    registry=REGISTRY
+)
+
+queue_depth = Gauge(
+    "payment_processor_queue_messages",
+    "Messages ready in the queue (passive queue_declare)",
+    ["queue"],
+    registry=REGISTRY
+)
+
+queue_consumers = Gauge(
+    "payment_processor_queue_consumers",
+    "Consumers attached to the queue (passive queue_declare)",
+    ["queue"],
+    registry=REGISTRY
+)
+
+queue_deliveries = Counter(
+    "payment_processor_queue_deliveries_total",
+    "Messages taken off the queue by this process; sum(rate()) over replicas is the fleet drain rate",
+    ["queue"],
+    registry=REGISTRY
+)
+
+drain_rate = Gauge(
+    "payment_processor_drain_rate_per_second",
+    "Messages taken off the queue per second by this process over the last sampling window",
+    ["queue"],
+    registry=REGISTRY
+)
+
+estimated_drain_seconds = Gauge(
+    "payment_processor_estimated_drain_seconds",
+    "Estimated seconds to empty the queue at the fleet drain rate (local rate scaled by broker consumer count)",
+    ["queue"],
+    registry=REGISTRY
+)
+
+# ---------------- Outbox Relay ----------------
+
+outbox_lag_seconds = Gauge(
+    "payment_processor_outbox_lag_seconds",
+    "Age of the oldest unpublished outbox entry",
+    registry=REGISTRY
+)
+
+outbox_pending = Gauge(
+    "payment_processor_outbox_pending",
+    "Outbox entries waiting to be published",
+    registry=REGISTRY
+)
+
+outbox_published = Counter(
+    "payment_processor_outbox_published_total",
+    "Result events published by the outbox relay",
+    registry=REGISTRY
+)
+
+outbox_orphaned = Counter(
+    "payment_processor_outbox_orphaned_total",
+    "Outbox entries dropped because the status update never landed",
+    registry=REGISTRY
+)
@@ -0,0 +1,218 @@
+import threading
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, UpdateOne
+
+# ---------------------------
+# Aggregates Read Model
+# ---------------------------
+# One document per (dimension, user_id, currency, status, hour bucket):
+#   dimension="user"     -> per user, per currency
+#   dimension="currency" -> per currency across all users (user_id=None)
+# Buckets are the UTC hour of the transaction's created_at, so every status
+# transition of a payment moves its count/amount between statuses within the
+# same bucket, and a rebuild from payment_transactions yields the same result.
+
+
+def bucket_for(ts):
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+class PaymentAggregates:
+    def __init__(self, db, collection_name="payment_aggregates"):
+        self.db = db
+        self.collection_name = collection_name
+        self.collection = db[collection_name]
+        self._ensure_indexes(self.collection)
+
+    @staticmethod
+    def _ensure_indexes(collection):
+        collection.create_index(
+            [
+                ("dimension", ASCENDING),
+                ("user_id", ASCENDING),
+                ("currency", ASCENDING),
+                ("status", ASCENDING),
+                ("bucket", ASCENDING),
+            ],
+            unique=True
+        )
+
+    @staticmethod
+    def _keys(user_id, currency, status, bucket):
+        return (
+            {"dimension": "user", "user_id": user_id, "currency": currency,
+             "status": status, "bucket": bucket},
+            {"dimension": "currency", "user_id": None, "currency": currency,
+             "status": status, "bucket": bucket},
+        )
+
+    # ---------- Incremental maintenance ----------
+
+    def deltas(self, txn, old_status, new_status):
+        """(aggregate key, count delta, amount delta) for one transition"""
+        bucket = bucket_for(txn["created_at"])
+        amount = txn["amount"]
+        if old_status is not None:
+            for key in self._keys(txn["user_id"], txn["currency"], old_status, bucket):
+                yield key, -1, -amount
+        for key in self._keys(txn["user_id"], txn["currency"], new_status, bucket):
+            yield key, 1, amount
+
+    def record_transition(self, txn, old_status, new_status):
+        """
+        Move one transaction from old_status to new_status ($inc on both
+        sides). old_status=None means the transaction was just created.
+        txn needs user_id, currency, amount and created_at.
+        """
+        if old_status == new_status:
+            return
+
+        self.collection.bulk_write([
+            UpdateOne(key, {"$inc": {"count": count, "amount": amount}}, upsert=True)
+            for key, count, amount in self.deltas(txn, old_status, new_status)
+        ], ordered=False)
+
+    # ---------- Batch rebuild ----------
+
+    def rebuild(self, source_collection):
+        """
+        Recompute every aggregate from payment_transactions into a staging
+        collection, then swap it in atomically with renameCollection.
+        """
+        staging_name = f"{self.collection_name}_rebuild"
+        self.db.drop_collection(staging_name)
+
+        group_stage = {
+            "_id": {
+                "user_id": "$user_id",
+                "currency": "$currency",
+                "status": "$status",
+                "bucket": {"$dateTrunc": {"date": "$created_at", "unit": "hour"}},
+            },
+            "count": {"$sum": 1},
+            "amount": {"$sum": "$amount"},
+        }
+
+        docs = []
+        by_currency = {}
+        for row in source_collection.aggregate([{"$group": group_stage}], allowDiskUse=True):
+            k = row["_id"]
+            docs.append({
+                "dimension": "user",
+                "user_id": k["user_id"],
+                "currency": k["currency"],
+                "status": k["status"],
+                "bucket": k["bucket"],
+                "count": row["count"],
+                "amount": row["amount"],
+            })
+            ck = (k["currency"], k["status"], k["bucket"])
+            total = by_currency.setdefault(ck, [0, 0])
+            total[0] += row["count"]
+            total[1] += row["amount"]
+
+        for (currency, status, bucket), (count, amount) in by_currency.items():
+            docs.append({
+                "dimension": "currency",
+                "user_id": None,
+                "currency": currency,
+                "status": status,
+                "bucket": bucket,
+                "count": count,
+                "amount": amount,
+            })
+
+        staging = self.db[staging_name]
+        self._ensure_indexes(staging)
+        if docs:
+            staging.insert_many(docs, ordered=False)
+        staging.rename(self.collection_name, dropTarget=True)
+
+        self.collection = self.db[self.collection_name]
+        return len(docs)
+
+    # ---------- Read side ----------
+
+    def query(self, user_id=None, currency=None, status="COMPLETED", start=None, end=None):
+        """
+        Sum the hourly buckets in [start, end) (defaults to today, UTC).
+        Returns totals per currency plus the individual buckets.
+        """
+        if start is None:
+            start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        if end is None:
+            end = start + timedelta(days=1)
+
+        query = {
+            "dimension": "user" if user_id else "currency",
+            "user_id": user_id or None,
+            "status": status,
+            "bucket": {"$gte": bucket_for(start), "$lt": end},
+        }
+        if currency:
+            query["currency"] = currency
+
+        buckets = []
+        totals = {}
+        for doc in self.collection.find(query, {"_id": 0}).sort("bucket", ASCENDING):
+            buckets.append({
+                "bucket": doc["bucket"].isoformat() + "Z",
+                "currency": doc["currency"],
+                "count": doc["count"],
+                "amount": doc["amount"],
+            })
+            total = totals.setdefault(doc["currency"], {"count": 0, "amount": 0})
+            total["count"] += doc["count"]
+            total["amount"] += doc["amount"]
+
+        return {"totals": totals, "buckets": buckets}
+
+
+class BatchedAggregates:
+    """
+    Collects transitions in memory, summing deltas per aggregate document,
+    and applies them with one bulk_write on flush(). Used by bulk ingest.
+    Deltas are kept per idempotency_key until flush() so the transitions of
+    a key whose status write lost can be dropped with discard().
+    """
+
+    def __init__(self, aggregates):
+        self.aggregates = aggregates
+        self._lock = threading.Lock()
+        self._pending = {}    # idempotency_key -> {aggregate ident: [count, amount]}
+
+    def record_transition(self, txn, old_status, new_status):
+        if old_status == new_status:
+            return
+        with self._lock:
+            pending = self._pending.setdefault(txn["idempotency_key"], {})
+            for key, count, amount in self.aggregates.deltas(txn, old_status, new_status):
+                total = pending.setdefault(tuple(key.items()), [0, 0])
+                total[0] += count
+                total[1] += amount
+
+    def discard(self, keys):
+        """Drop everything buffered for these idempotency keys"""
+        with self._lock:
+            for key in keys:
+                self._pending.pop(key, None)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        totals = {}
+        for deltas in pending.values():
+            for ident, (count, amount) in deltas.items():
+                total = totals.setdefault(ident, [0, 0])
+                total[0] += count
+                total[1] += amount
+
+        ops = [
+            UpdateOne(dict(ident), {"$inc": {"count": count, "amount": amount}}, upsert=True)
+            for ident, (count, amount) in totals.items()
+            if count or amount
+        ]
+        if ops:
+            self.aggregates.collection.bulk_write(ops, ordered=False)
+        return len(ops)
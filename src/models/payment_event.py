@@ -0,0 +1,135 @@
+import os
+import re
+from datetime import datetime
+
+# ---------------------------
+# Validation Rules (compiled once at import)
+# ---------------------------
+ALLOWED_CURRENCIES = frozenset(
+    c.strip().upper()
+    for c in os.getenv("PAYMENT_ALLOWED_CURRENCIES", "USD,EUR,GBP,INR").split(",")
+    if c.strip()
+)
+MIN_AMOUNT = float(os.getenv("PAYMENT_MIN_AMOUNT", 0.01))
+MAX_AMOUNT = float(os.getenv("PAYMENT_MAX_AMOUNT", 1000000))
+KEY_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.:\-]{0,127}")
+_match_key = KEY_PATTERN.fullmatch
+
+
+class InvalidPaymentEvent(ValueError):
+    """Event failed schema / business validation and can never succeed"""
+    pass
+
+
+# ---------------------------
+# Payment Event
+# ---------------------------
+class PaymentEvent:
+    """
+    Decoded PaymentInitiated event.
+
+    Built once per message by from_dict(), which validates every field in a
+    single pass so bad events are rejected before any repository access.
+    """
+
+    __slots__ = (
+        "idempotency_key",
+        "amount",
+        "currency",
+        "user_id",
+        "timestamp",
+        "metadata",
+        "simulate_transient_failure",
+        "simulate_permanent_failure",
+    )
+
+    def __init__(self, idempotency_key, amount, currency, user_id,
+                 timestamp=None, metadata=None):
+        self.idempotency_key = idempotency_key
+        self.amount = amount
+        self.currency = currency
+        self.user_id = user_id
+        self.timestamp = timestamp
+        self.metadata = metadata or {}
+        self.simulate_transient_failure = bool(
+            self.metadata.get("simulate_transient_failure", False)
+        )
+        self.simulate_permanent_failure = bool(
+            self.metadata.get("simulate_permanent_failure", False)
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        # Hot path: exact type checks and one lookup per field, then fill the
+        # slots directly instead of re-reading metadata in __init__.
+        if data.__class__ is not dict:
+            raise InvalidPaymentEvent("event must be a JSON object")
+        get = data.get
+
+        key = get("idempotency_key")
+        if key.__class__ is not str or _match_key(key) is None:
+            raise InvalidPaymentEvent(f"invalid idempotency_key: {key!r}")
+
+        amount = get("amount")
+        if amount.__class__ is int:
+            amount = float(amount)
+        elif amount.__class__ is not float:
+            raise InvalidPaymentEvent(f"invalid amount: {amount!r}")
+        if not MIN_AMOUNT <= amount <= MAX_AMOUNT:
+            raise InvalidPaymentEvent(
+                f"amount {amount} outside [{MIN_AMOUNT}, {MAX_AMOUNT}]"
+            )
+
+        currency = get("currency")
+        if currency.__class__ is not str:
+            raise InvalidPaymentEvent(f"unsupported currency: {currency!r}")
+        if currency not in ALLOWED_CURRENCIES:
+            currency = currency.upper()
+            if currency not in ALLOWED_CURRENCIES:
+                raise InvalidPaymentEvent(f"unsupported currency: {currency!r}")
+
+        user_id = get("user_id")
+        if user_id.__class__ is not str or not user_id:
+            raise InvalidPaymentEvent(f"invalid user_id: {user_id!r}")
+
+        metadata = get("metadata")
+        if metadata is None:
+            metadata = {}
+            transient = permanent = False
+        elif metadata.__class__ is dict:
+            transient = bool(metadata.get("simulate_transient_failure", False))
+            permanent = bool(metadata.get("simulate_permanent_failure", False))
+        else:
+            raise InvalidPaymentEvent("metadata must be an object")
+
+        event = cls.__new__(cls)
+        event.idempotency_key = key
+        event.amount = amount
+        event.currency = currency
+        event.user_id = user_id
+        event.timestamp = get("timestamp")
+        event.metadata = metadata
+        event.simulate_transient_failure = transient
+        event.simulate_permanent_failure = permanent
+        return event
+
+    def to_document(self, status, retry_count=0, last_error_message=None):
+        """MongoDB payment_transactions document"""
+        now = datetime.utcnow()
+        return {
+            "idempotency_key": self.idempotency_key,
+            "amount": self.amount,
+            "currency": self.currency,
+            "user_id": self.user_id,
+            "status": status,
+            "retry_count": retry_count,
+            "last_error_message": last_error_message,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    def __repr__(self):
+        return (
+            f"PaymentEvent(key={self.idempotency_key!r}, amount={self.amount}, "
+            f"currency={self.currency!r}, user_id={self.user_id!r})"
+        )
@@ -1,4 +1,5 @@
 from pymongo import MongoClient, ASCENDING
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
 
 class PaymentRepository:
@@ -16,9 +17,14 @@ class PaymentRepository:
         return self.collection.find_one({"idempotency_key": key})
 
     def create_transaction(self, data):
+        """False if another delivery of the same key inserted it first"""
         data["created_at"] = datetime.utcnow()
         data["updated_at"] = datetime.utcnow()
-        self.collection.insert_one(data)
+        try:
+            self.collection.insert_one(data)
+        except DuplicateKeyError:
+            return False
+        return True
 
     def update_transaction(self, key, updates):
         updates["updated_at"] = datetime.utcnow()
@@ -26,3 +32,12 @@ class PaymentRepository:
             {"idempotency_key": key},
             {"$set": updates}
         )
+
+    def transition_status(self, key, old_status, updates):
+        """Apply updates only if the status is still old_status; True if it was"""
+        updates["updated_at"] = datetime.utcnow()
+        result = self.collection.update_one(
+            {"idempotency_key": key, "status": old_status},
+            {"$set": updates}
+        )
+        return result.matched_count == 1
@@ -0,0 +1,146 @@
+import threading
+from datetime import datetime
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+# ---------------------------
+# Transactional Outbox
+# ---------------------------
+# Result events (COMPLETED / FAILED) are written here *before* the status
+# update on payment_transactions. The relay publishes an entry only once the
+# transaction is in the entry's status with updated_at caught up with it, so
+# an outbox write whose status update never landed is never announced (it is
+# marked ORPHANED).
+# This gives outbox semantics on a standalone MongoDB without multi-document
+# transactions.
+#
+# One entry per (key, status), announced at most once: writing it again
+# re-arms a PENDING / ORPHANED entry but never touches a PUBLISHED one, so
+# reprocessing a FAILED key does not publish a second PaymentFailed.
+
+PENDING = "PENDING"
+PUBLISHED = "PUBLISHED"
+ORPHANED = "ORPHANED"
+
+RESULT_STATUSES = ("COMPLETED", "FAILED")
+
+DUPLICATE_KEY = 11000
+
+
+def outbox_id(key, status):
+    return f"{key}:{status}"
+
+
+def _unpublished_upsert(entry):
+    """
+    (filter, update) for an upsert: the filter misses a PUBLISHED entry, so
+    the upsert collides on _id (DUPLICATE_KEY) instead of resetting it
+    """
+    fields = {k: v for k, v in entry.items() if k != "_id"}
+    return {"_id": entry["_id"], "state": {"$ne": PUBLISHED}}, {"$set": fields}
+
+
+def outbox_entry(txn, status, error=None):
+    key = txn["idempotency_key"]
+    now = datetime.utcnow()
+    return {
+        "_id": outbox_id(key, status),
+        "state": PENDING,
+        "created_at": now,
+        "event": {
+            "type": f"Payment{status.capitalize()}",
+            "idempotency_key": key,
+            "status": status,
+            "amount": txn["amount"],
+            "currency": txn["currency"],
+            "user_id": txn["user_id"],
+            "error": error,
+            "occurred_at": now.isoformat() + "Z",
+        },
+    }
+
+
+class PaymentOutbox:
+    def __init__(self, db, collection_name="payment_outbox"):
+        self.collection = db[collection_name]
+        self.collection.create_index([("state", ASCENDING), ("created_at", ASCENDING)])
+
+    # ---------- Write side (PaymentService) ----------
+
+    def add(self, txn, status, error=None):
+        query, update = _unpublished_upsert(outbox_entry(txn, status, error))
+        try:
+            self.collection.update_one(query, update, upsert=True)
+        except DuplicateKeyError:
+            pass  # already PUBLISHED
+
+    # ---------- Read side (relay) ----------
+
+    def fetch_pending(self, limit):
+        return list(
+            self.collection.find({"state": PENDING})
+            .sort("created_at", ASCENDING)
+            .limit(limit)
+        )
+
+    def mark(self, ids, state):
+        if not ids:
+            return 0
+        result = self.collection.update_many(
+            {"_id": {"$in": list(ids)}, "state": PENDING},
+            {"$set": {"state": state, "relayed_at": datetime.utcnow()}}
+        )
+        return result.modified_count
+
+    def oldest_pending_at(self):
+        doc = self.collection.find_one(
+            {"state": PENDING}, {"created_at": 1}, sort=[("created_at", ASCENDING)]
+        )
+        return doc["created_at"] if doc else None
+
+    def pending_count(self):
+        return self.collection.count_documents({"state": PENDING})
+
+
+class BatchedOutbox:
+    """Buffers outbox entries for bulk ingest; flush() before the repository flush"""
+
+    def __init__(self, outbox):
+        self.outbox = outbox
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flushed = []    # entries written by the last flush()
+
+    def add(self, txn, status, error=None):
+        entry = outbox_entry(txn, status, error)
+        with self._lock:
+            self._pending[entry["_id"]] = entry
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        ops = [UpdateOne(*_unpublished_upsert(entry), upsert=True) for entry in pending.values()]
+        if ops:
+            try:
+                self.outbox.collection.bulk_write(ops, ordered=False)
+            except BulkWriteError as e:
+                # DUPLICATE_KEY: already PUBLISHED, left as is
+                if any(err.get("code") != DUPLICATE_KEY for err in e.details.get("writeErrors", [])):
+                    raise
+        self._flushed = list(pending.values())
+        return len(ops)
+
+    def retract(self, conflicts):
+        """
+        After the repository flush: orphan the entries just written for keys
+        whose status write lost ({key: current status}), unless the winner
+        reached the same status - then the entry announces its transition.
+        """
+        ids = [
+            entry["_id"] for entry in self._flushed
+            if entry["event"]["idempotency_key"] in conflicts
+            and entry["event"]["status"] != conflicts[entry["event"]["idempotency_key"]]
+        ]
+        self._flushed = []
+        return self.outbox.mark(ids, ORPHANED)
@@ -3,6 +3,8 @@ import time
 import pika
 from config import Config
 from services.payment_service import TransientError, PermanentError
+from services.retry_delay import declare_retry_queue, publish_retry
+from models.payment_event import PaymentEvent
 
 from api.health_metrics import (
     messages_consumed,
@@ -13,8 +15,10 @@ from api.health_metrics import (
 
 
 class MQConsumer:
-    def __init__(self, payment_service):
+    def __init__(self, payment_service, queue=None):
+        """queue: the priority lane this consumer serves (default: initiation queue)"""
         self.payment_service = payment_service
+        self.queue = queue or Config.PAYMENT_INITIATION_QUEUE
         self.channel = None
         self._connect_to_rabbitmq()
 
@@ -42,7 +46,7 @@ class MQConsumer:
                 self.channel = connection.channel()
 
                 self.channel.queue_declare(
-                    queue=Config.PAYMENT_INITIATION_QUEUE,
+                    queue=self.queue,
                     durable=True
                 )
 
@@ -51,6 +55,9 @@ class MQConsumer:
                     durable=True
                 )
 
+                for retry in range(Config.PAYMENT_RETRY_LIMIT):
+                    declare_retry_queue(self.channel, self.queue, self._backoff(retry))
+
                 print("Connected to RabbitMQ ✅")
                 break
 
@@ -61,15 +68,39 @@ class MQConsumer:
     def start(self):
         self.channel.basic_qos(prefetch_count=1)
         self.channel.basic_consume(
-            queue=Config.PAYMENT_INITIATION_QUEUE,
+            queue=self.queue,
             on_message_callback=self._callback
         )
-        print("Waiting for payment messages...")
+        print(f"Waiting for payment messages on {self.queue}...")
         self.channel.start_consuming()
 
+    @staticmethod
+    def _backoff(retry):
+        return Config.PAYMENT_RETRY_INITIAL_DELAY_SECONDS * (2 ** retry)
+
+    def _send_to_dlq(self, ch, body):
+        ch.basic_publish(
+            exchange="",
+            routing_key=Config.PAYMENT_DLQ,
+            body=body,
+            properties=pika.BasicProperties(
+                delivery_mode=2
+            )
+        )
+
     def _callback(self, ch, method, properties, body):
         messages_consumed.inc()
-        event = json.loads(body)
+
+        try:
+            event = PaymentEvent.from_dict(json.loads(body))
+        except ValueError as e:
+            # Bad JSON, non-UTF-8 bytes or InvalidPaymentEvent (all ValueErrors);
+            # rejected before any DB access
+            print(f"Invalid event, sending to DLQ ❌: {str(e)}")
+            payments_failed.inc()
+            self._send_to_dlq(ch, body)
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
 
         try:
             # Try processing payment
@@ -90,27 +121,19 @@ class MQConsumer:
             if retries >= Config.PAYMENT_RETRY_LIMIT:
                 print("Retry limit exceeded, sending to DLQ ❌")
                 payments_failed.inc()
-
-                ch.basic_publish(
-                    exchange="",
-                    routing_key=Config.PAYMENT_DLQ,
-                    body=body,
-                    properties=pika.BasicProperties(
-                        delivery_mode=2
+                try:
+                    # Writes the PaymentFailed outbox entry
+                    self.payment_service.fail_payment(
+                        event, f"Retries exhausted after {retries} attempts"
                     )
-                )
+                except Exception as e:
+                    print(f"Could not mark payment FAILED: {str(e)}")
+                self._send_to_dlq(ch, body)
             else:
-                delay = 2 ** retries
-                time.sleep(delay)
-
-                ch.basic_publish(
-                    exchange="",
-                    routing_key=Config.PAYMENT_INITIATION_QUEUE,
-                    body=body,
-                    properties=pika.BasicProperties(
-                        headers={"x-retry": retries + 1},
-                        delivery_mode=2
-                    )
+                # Delay queue dead-letters it back to self.queue; no sleep here
+                publish_retry(
+                    ch, self.queue, self._backoff(retries), body,
+                    {"x-retry": retries + 1}
                 )
 
             ch.basic_ack(delivery_tag=method.delivery_tag)
@@ -118,14 +141,6 @@ class MQConsumer:
         except PermanentError as e:
             print(f"Permanent error, sending to DLQ ❌: {str(e)}")
             payments_failed.inc()
-
-            ch.basic_publish(
-                exchange="",
-                routing_key=Config.PAYMENT_DLQ,
-                body=body,
-                properties=pika.BasicProperties(
-                    delivery_mode=2
-                )
-            )
+            self._send_to_dlq(ch, body)
 
             ch.basic_ack(delivery_tag=method.delivery_tag)
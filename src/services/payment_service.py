@@ -1,7 +1,9 @@
 import random
 import time
+import logging
 from datetime import datetime
 from prometheus_client import Counter
+from models.payment_event import PaymentEvent, InvalidPaymentEvent
 
 # ---------------------------
 # Custom Exceptions
@@ -44,26 +46,85 @@ retries_total = Counter(
 # Payment Service
 # ---------------------------
 class PaymentService:
-    def __init__(self, repo):
+    def __init__(self, repo, aggregates=None, outbox=None):
         """
         repo must implement:
         - find_by_idempotency_key(key)
-        - create_transaction(data)
-        - update_transaction(key, update)
+        - create_transaction(data) -> False if the key already exists
+        - transition_status(key, old_status, updates) -> False if the
+          status is no longer old_status
+
+        aggregates (optional) must implement:
+        - record_transition(txn, old_status, new_status)
+
+        outbox (optional) must implement:
+        - add(txn, status, error=None)
         """
         self.repo = repo
+        self.aggregates = aggregates
+        self.outbox = outbox
+
+    def _set_status(self, txn, new_status, updates):
+        """
+        Conditional on the status we read: when two deliveries of one key
+        race, only the one whose transition matched moves the aggregates.
+        """
+        old_status = txn["status"]
+        updates["status"] = new_status
+        if self.outbox is not None and new_status in ("COMPLETED", "FAILED"):
+            # Outbox first: the relay only publishes once this update lands
+            self.outbox.add(txn, new_status, updates.get("last_error_message"))
+        moved = self.repo.transition_status(txn["idempotency_key"], old_status, updates)
+        if moved:
+            self._record_aggregates(txn, old_status, new_status)
+        return moved
+
+    def _record_aggregates(self, txn, old_status, new_status):
+        """
+        Best effort: the status write is the source of truth, so a read-model
+        failure must not fail (or DLQ) the payment. rebuild_aggregates.py
+        repairs the drift.
+        """
+        if self.aggregates is None:
+            return
+        try:
+            self.aggregates.record_transition(txn, old_status, new_status)
+        except Exception:
+            logging.exception(
+                f"[!] Aggregates update {old_status}->{new_status} failed for "
+                f"key={txn['idempotency_key']}; run rebuild_aggregates.py"
+            )
+
+    def fail_payment(self, event, error):
+        """
+        Retries exhausted: move the transaction to FAILED so the outbox
+        announces it before the message goes to the DLQ. Returns False if
+        the key is missing or already COMPLETED / FAILED.
+        """
+        txn = self.repo.find_by_idempotency_key(event.idempotency_key)
+        if txn is None or txn["status"] in ("COMPLETED", "FAILED"):
+            return False
+        payments_failed.inc()
+        return self._set_status(txn, "FAILED", {
+            "last_error_message": error,
+            "updated_at": datetime.utcnow()
+        })
 
     def process_payment(self, event):
-        key = event["idempotency_key"]
+        """
+        event may be a PaymentEvent or the raw decoded dict; invalid events
+        raise PermanentError before the repository is touched.
+        """
+        if not isinstance(event, PaymentEvent):
+            try:
+                event = PaymentEvent.from_dict(event)
+            except InvalidPaymentEvent as e:
+                payments_failed.inc()
+                raise PermanentError(f"Invalid event: {e}") from e
+
+        key = event.idempotency_key
         messages_consumed.inc()
 
-        simulate_transient = event.get("metadata", {}).get(
-            "simulate_transient_failure", False
-        )
-        simulate_permanent = event.get("metadata", {}).get(
-            "simulate_permanent_failure", False
-        )
-
         # ---------------------------
         # 1️⃣ Idempotency Check
         # ---------------------------
@@ -73,18 +134,17 @@ class PaymentService:
             # Already processed successfully
             return "IDEMPOTENT_SKIP"
 
-        if not existing:
-            self.repo.create_transaction({
-                "idempotency_key": key,
-                "amount": event["amount"],
-                "currency": event["currency"],
-                "user_id": event["user_id"],
-                "status": "PROCESSING",
-                "retry_count": 0,
-                "last_error_message": None,
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            })
+        if existing:
+            txn = existing
+        else:
+            txn = event.to_document("PROCESSING")
+            if self.repo.create_transaction(txn):
+                self._record_aggregates(txn, None, "PROCESSING")
+            else:
+                # A concurrent delivery of the same key inserted it first
+                existing = txn = self.repo.find_by_idempotency_key(key)
+                if txn["status"] == "COMPLETED":
+                    return "IDEMPOTENT_SKIP"
 
         # ---------------------------
         # 2️⃣ Simulate Processing
@@ -93,17 +153,16 @@ class PaymentService:
             time.sleep(0.1)
 
             # Simulated failures
-            if simulate_transient or random.random() < 0.2:
+            if event.simulate_transient_failure or random.random() < 0.2:
                 raise TransientError("Temporary payment gateway issue")
 
-            if simulate_permanent or random.random() < 0.05:
+            if event.simulate_permanent_failure or random.random() < 0.05:
                 raise PermanentError("Invalid card details")
 
             # ---------------------------
             # 3️⃣ Success
             # ---------------------------
-            self.repo.update_transaction(key, {
-                "status": "COMPLETED",
+            self._set_status(txn, "COMPLETED", {
                 "updated_at": datetime.utcnow()
             })
             payments_successful.inc()
@@ -117,8 +176,7 @@ class PaymentService:
 
             retry_count = (existing.get("retry_count", 0) + 1) if existing else 1
 
-            self.repo.update_transaction(key, {
-                "status": "RETRYING",   # ✅ IMPORTANT FIX
+            self._set_status(txn, "RETRYING", {   # ✅ IMPORTANT FIX
                 "retry_count": retry_count,
                 "last_error_message": str(e),
                 "updated_at": datetime.utcnow()
@@ -132,8 +190,7 @@ class PaymentService:
         except PermanentError as e:
             payments_failed.inc()
 
-            self.repo.update_transaction(key, {
-                "status": "FAILED",
+            self._set_status(txn, "FAILED", {
                 "last_error_message": str(e),
                 "updated_at": datetime.utcnow()
             })
@@ -0,0 +1,88 @@
+import os
+import json
+
+# ---------------------------
+# Priority Lanes
+# ---------------------------
+# Each lane is its own durable queue with its own consumers, so a backlog in
+# the default lane cannot delay high-priority payments. Rules are evaluated
+# in order; the first match picks the lane, otherwise DEFAULT_LANE.
+#
+# PAYMENT_PRIORITY_RULES (JSON list), each rule may combine:
+#   {"lane": "high", "min_amount": 1000, "max_amount": ..., "currency": ["USD"],
+#    "metadata": {"time_critical": true}}
+# PAYMENT_LANE_CONSUMERS (JSON object): consumers reserved per lane.
+
+DEFAULT_LANE = "default"
+
+DEFAULT_RULES = [
+    {"lane": "high", "min_amount": 1000},
+    {"lane": "high", "metadata": {"priority": "high"}},
+]
+
+DEFAULT_LANE_CONSUMERS = {"high": 1, DEFAULT_LANE: 1}
+
+
+class _Rule:
+    __slots__ = ("lane", "min_amount", "max_amount", "currencies", "metadata")
+
+    def __init__(self, spec):
+        self.lane = spec["lane"]
+        self.min_amount = spec.get("min_amount")
+        self.max_amount = spec.get("max_amount")
+        currency = spec.get("currency")
+        if isinstance(currency, str):
+            currency = [currency]
+        self.currencies = frozenset(c.upper() for c in currency) if currency else None
+        self.metadata = tuple((spec.get("metadata") or {}).items())
+
+    def matches(self, event):
+        if self.min_amount is not None and event.amount < self.min_amount:
+            return False
+        if self.max_amount is not None and event.amount > self.max_amount:
+            return False
+        if self.currencies is not None and event.currency not in self.currencies:
+            return False
+        for key, value in self.metadata:
+            if event.metadata.get(key) != value:
+                return False
+        return True
+
+
+class PriorityRouter:
+    def __init__(self, base_queue, rules=None, lane_consumers=None):
+        self.base_queue = base_queue
+        self.rules = [_Rule(r) for r in (DEFAULT_RULES if rules is None else rules)]
+        self.lane_consumers = dict(lane_consumers or DEFAULT_LANE_CONSUMERS)
+        self.lane_consumers.setdefault(DEFAULT_LANE, 1)
+        for rule in self.rules:
+            self.lane_consumers.setdefault(rule.lane, 1)
+
+    @classmethod
+    def from_env(cls, base_queue):
+        rules = os.getenv("PAYMENT_PRIORITY_RULES")
+        consumers = os.getenv("PAYMENT_LANE_CONSUMERS")
+        return cls(
+            base_queue,
+            json.loads(rules) if rules else None,
+            json.loads(consumers) if consumers else None
+        )
+
+    def queue_for(self, lane):
+        # The default lane keeps the original queue name
+        if lane == DEFAULT_LANE:
+            return self.base_queue
+        return f"{self.base_queue}.{lane}"
+
+    def lanes(self):
+        return list(self.lane_consumers)
+
+    def lane_for(self, event):
+        """event is a PaymentEvent"""
+        for rule in self.rules:
+            if rule.matches(event):
+                return rule.lane
+        return DEFAULT_LANE
+
+    def route(self, event):
+        return self.queue_for(self.lane_for(event))
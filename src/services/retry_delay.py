@@ -0,0 +1,41 @@
+import pika
+
+# ---------------------------
+# Retry Delay Queues
+# ---------------------------
+# A transient failure is parked in <queue>.retry.<delay>s, a consumer-less
+# queue whose x-message-ttl dead-letters the message back into the lane queue
+# once the delay has passed. The lane's consumer acks and moves on instead of
+# sleeping, so retries never hold a consumer that other payments in the lane
+# are waiting for.
+#
+# One queue per backoff level: TTL expiry only happens at the head of a queue,
+# so mixing 2s and 8s messages in one queue would delay the short ones.
+
+
+def retry_queue_name(queue, delay):
+    return f"{queue}.retry.{delay}s"
+
+
+def declare_retry_queue(channel, queue, delay):
+    """Declare the delay queue that feeds `queue` after `delay` seconds"""
+    name = retry_queue_name(queue, delay)
+    channel.queue_declare(
+        queue=name,
+        durable=True,
+        arguments={
+            "x-message-ttl": int(delay * 1000),
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": queue,
+        }
+    )
+    return name
+
+
+def publish_retry(channel, queue, delay, body, headers):
+    channel.basic_publish(
+        exchange="",
+        routing_key=retry_queue_name(queue, delay),
+        body=body,
+        properties=pika.BasicProperties(delivery_mode=2, headers=headers)
+    )
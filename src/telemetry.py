@@ -0,0 +1,174 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+import pika
+
+from metrics import (
+    end_to_end_latency,
+    queue_depth,
+    queue_consumers,
+    queue_deliveries,
+    drain_rate,
+    estimated_drain_seconds
+)
+
+
+# ---------------------------
+# Helpers
+# ---------------------------
+def parse_event_timestamp(value):
+    """Parse the ISO-8601 publish timestamp ("...Z") into epoch seconds"""
+    if not value:
+        return None
+    try:
+        if value.endswith("Z"):
+            value = value[:-1] + "+00:00"
+        ts = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+# ---------------------------
+# Pipeline Telemetry
+# ---------------------------
+class PipelineTelemetry:
+    """
+    Records publish-to-completion latency and periodically samples queue
+    depth / consumer counts with a passive queue_declare.
+
+    Drain time is only derived for consumed_queues, each from its own
+    delivery rate; observed_queues (e.g. the DLQ) only get depth gauges.
+    Depth is global but deliveries are per process, so the local rate is
+    scaled by the broker's consumer_count over this process's consumers
+    (local_consumers) to estimate the whole fleet's rate, assuming replicas
+    drain at similar speeds. The exact figure is PromQL over
+    payment_processor_queue_deliveries_total:
+        queue_messages / sum by (queue) (rate(queue_deliveries_total[1m]))
+
+    The sampler owns its own RabbitMQ connection: pika's BlockingConnection
+    is not thread-safe, so it must not share the consumer's channel.
+    """
+
+    def __init__(self, connection_params, consumed_queues, observed_queues=(),
+                 interval=15.0, clock=time.time, local_consumers=None):
+        self.connection_params = connection_params
+        self.consumed_queues = [q for q in consumed_queues if q]
+        self.observed_queues = [q for q in observed_queues if q]
+        self.local_consumers = {
+            q: (local_consumers or {}).get(q, 1) for q in self.consumed_queues
+        }
+        self.interval = interval
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._delivered = {q: 0 for q in self.consumed_queues}
+        self._last_delivered = dict(self._delivered)
+        self._last_sample_at = None
+
+        self._connection = None
+        self._channel = None
+
+    # ---------- Latency / Deliveries ----------
+
+    def record_delivery(self, queue):
+        """Call once per message taken off a consumed queue"""
+        with self._lock:
+            self._delivered[queue] = self._delivered.get(queue, 0) + 1
+        queue_deliveries.labels(queue=queue).inc()
+
+    def observe_completion(self, published_at, outcome, lane="default"):
+        """
+        Call once a message has reached a terminal state for this delivery.
+        published_at is the event's raw "timestamp" field.
+        """
+        published = parse_event_timestamp(published_at)
+        if published is None:
+            return
+        end_to_end_latency.labels(lane=lane, outcome=outcome).observe(
+            max(0.0, self.clock() - published)
+        )
+
+    # ---------- Queue Sampling ----------
+
+    def _open_channel(self):
+        if self._connection is None or self._connection.is_closed:
+            self._connection = pika.BlockingConnection(self.connection_params)
+            self._channel = None
+        if self._channel is None or self._channel.is_closed:
+            self._channel = self._connection.channel()
+        return self._channel
+
+    def _declare_passive(self, queue):
+        try:
+            return self._open_channel().queue_declare(queue=queue, passive=True)
+        except pika.exceptions.ChannelClosedByBroker as e:
+            # 404 NOT_FOUND closes the channel; the next declare reopens it
+            self._channel = None
+            logging.debug(f"Queue {queue} not available for sampling: {e}")
+            return None
+
+    def _rates(self, now):
+        """Per-queue deliveries/s since the previous sample (None on the first)"""
+        with self._lock:
+            delivered = dict(self._delivered)
+
+        rates = None
+        if self._last_sample_at is not None and now > self._last_sample_at:
+            elapsed = now - self._last_sample_at
+            rates = {
+                q: (delivered.get(q, 0) - self._last_delivered.get(q, 0)) / elapsed
+                for q in self.consumed_queues
+            }
+        self._last_delivered = delivered
+        self._last_sample_at = now
+        return rates
+
+    def sample(self):
+        """Take one sample of every queue and refresh the derived gauges"""
+        rates = self._rates(self.clock())
+
+        for queue in self.consumed_queues + self.observed_queues:
+            result = self._declare_passive(queue)
+            if result is None:
+                continue
+
+            messages = result.method.message_count
+            queue_depth.labels(queue=queue).set(messages)
+            queue_consumers.labels(queue=queue).set(result.method.consumer_count)
+
+            if rates is None or queue not in rates:
+                continue
+            rate = rates[queue]
+            drain_rate.labels(queue=queue).set(rate)
+            # Other replicas drain the same queue; never scale below our own
+            # consumers (the broker may not have re-registered them yet)
+            local = self.local_consumers[queue]
+            fleet_rate = rate * max(result.method.consumer_count, local) / local
+            if messages == 0:
+                estimated_drain_seconds.labels(queue=queue).set(0)
+            elif fleet_rate > 0:
+                estimated_drain_seconds.labels(queue=queue).set(messages / fleet_rate)
+            else:
+                estimated_drain_seconds.labels(queue=queue).set(float("inf"))
+
+    def _run(self):
+        while True:
+            try:
+                self.sample()
+            except pika.exceptions.AMQPError as e:
+                logging.warning(f"Queue telemetry sample failed: {e}")
+                self._connection = None
+                self._channel = None
+            time.sleep(self.interval)
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        logging.info(
+            f"Queue telemetry sampling {self.consumed_queues + self.observed_queues} "
+            f"every {self.interval}s"
+        )
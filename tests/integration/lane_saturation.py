@@ -0,0 +1,157 @@
+"""
+Priority-lane saturation check.
+
+Starts consumer.py against running RabbitMQ + MongoDB (docker compose),
+measures the high lane's p99 end-to-end latency under high-lane load alone,
+then again while the default lane is flooded well past its capacity, and
+fails if the saturated p99 exceeds the baseline by more than the allowed
+ratio. Transient-failure retries wait in per-lane delay queues, not on a
+consumer, so neither phase should see retries block the lane.
+
+Run directly:
+    python tests/integration/lane_saturation.py --phase 120
+or through pytest (tests/integration/test_e2e_processing.py) with
+LANE_SATURATION_SECONDS set.
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+import urllib.request
+
+import pika
+from prometheus_client.parser import text_string_to_metric_families
+
+from soak import ROOT, LoadGenerator, free_port
+
+QUEUE = os.getenv("PAYMENT_INITIATION_QUEUE", "payment_initiation")
+LATENCY_BUCKET = "payment_processor_end_to_end_latency_seconds_bucket"
+
+
+class HighPriorityLoad(LoadGenerator):
+    """Events the default rules route to the high lane"""
+
+    def _event(self):
+        event = super()._event()
+        event["metadata"]["priority"] = "high"
+        return event
+
+
+# ---------------------------
+# Histogram p99
+# ---------------------------
+def scrape_buckets(port):
+    """{lane: {le: cumulative count}} for successfully processed events"""
+    body = urllib.request.urlopen(f"http://localhost:{port}/metrics", timeout=5).read().decode()
+    buckets = {}
+    for family in text_string_to_metric_families(body):
+        for sample in family.samples:
+            if sample.name == LATENCY_BUCKET and sample.labels.get("outcome") == "success":
+                lane = buckets.setdefault(sample.labels["lane"], {})
+                lane[float(sample.labels["le"])] = sample.value
+    return buckets
+
+
+def p99(before, after, lane):
+    """
+    Upper bound of the bucket holding the 99th percentile of the events
+    observed between two scrapes, or None if there were none.
+    """
+    start, end = before.get(lane, {}), after.get(lane, {})
+    deltas = sorted((le, end[le] - start.get(le, 0.0)) for le in end)
+    if not deltas or deltas[-1][1] <= 0:
+        return None
+    target = 0.99 * deltas[-1][1]
+    for le, count in deltas:
+        if count >= target:
+            return le
+
+
+# ---------------------------
+# Comparison
+# ---------------------------
+def run_comparison(phase_seconds, high_rate=2, flood_rate=50, max_ratio=2.0):
+    """
+    Returns (result, failures). max_ratio defaults to 2.0 because p99 is read
+    off histogram buckets: one bucket step (e.g. 2.5s -> 5s) is a 2x ratio.
+    """
+    metrics_port = free_port()
+    env = dict(os.environ)
+    env.setdefault("MQ_HOST", "localhost")
+    env.setdefault("DB_HOST", "localhost")
+    env["SERVICE_PORT_METRICS"] = str(metrics_port)
+    consumer = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "consumer.py")],
+        env=env, cwd=ROOT,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    params = pika.ConnectionParameters(
+        host=env["MQ_HOST"],
+        credentials=pika.PlainCredentials(
+            os.getenv("MQ_USER", "guest"), os.getenv("MQ_PASS", "guest")
+        )
+    )
+    high = HighPriorityLoad(params, f"{QUEUE}.high", high_rate)
+    flood = LoadGenerator(params, QUEUE, flood_rate)
+
+    try:
+        time.sleep(10)  # let the consumer connect and bind its metrics port
+        high.start()
+        time.sleep(10)  # past any startup backlog before the baseline
+
+        start = scrape_buckets(metrics_port)
+        time.sleep(phase_seconds)
+        baseline = scrape_buckets(metrics_port)
+
+        flood.start()
+        time.sleep(phase_seconds)
+        saturated = scrape_buckets(metrics_port)
+    finally:
+        high.stop()
+        flood.stop()
+        consumer.terminate()
+        consumer.wait(timeout=30)
+        # Drop the flood backlog so it does not leak into the next run
+        try:
+            with pika.BlockingConnection(params) as connection:
+                connection.channel().queue_purge(QUEUE)
+        except pika.exceptions.AMQPError:
+            pass
+
+    result = {
+        "high_p99_baseline": p99(start, baseline, "high"),
+        "high_p99_saturated": p99(baseline, saturated, "high"),
+        "default_p99_saturated": p99(baseline, saturated, "default"),
+    }
+
+    failures = []
+    if result["high_p99_baseline"] is None or result["high_p99_saturated"] is None:
+        failures.append("no high-lane completions observed")
+    elif result["high_p99_saturated"] > result["high_p99_baseline"] * max_ratio:
+        failures.append(
+            f"high-lane p99 {result['high_p99_saturated']}s under default-lane "
+            f"saturation vs {result['high_p99_baseline']}s baseline (limit {max_ratio}x)"
+        )
+    return result, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare high-lane p99 with the default lane saturated")
+    parser.add_argument("--phase", type=float, default=120, help="seconds per phase")
+    parser.add_argument("--high-rate", type=float, default=2, help="high-lane events per second")
+    parser.add_argument("--flood-rate", type=float, default=50, help="default-lane events per second")
+    parser.add_argument("--max-ratio", type=float, default=2.0)
+    args = parser.parse_args()
+
+    result, failures = run_comparison(args.phase, args.high_rate, args.flood_rate, args.max_ratio)
+    for name, value in result.items():
+        print(f"{name:<24} {value}")
+    for failure in failures:
+        print(f"[X] {failure}")
+    print("[✓] High lane isolated" if not failures else "[X] High lane degraded")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
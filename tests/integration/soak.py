@@ -0,0 +1,470 @@
+"""
+Long-running soak harness.
+
+Starts RabbitMQ + MongoDB (docker compose), consumer.py and both /health
+servers (gunicorn consumer:app, as in the Dockerfile, and the src/ stack's
+api.health_metrics:app, which pings MongoDB and RabbitMQ) as child processes,
+drives a steady synthetic load well below consumer capacity for hours,
+restarts the dependencies mid-run, and fails if RSS, open file descriptors,
+thread count (of the consumer or either /health worker), per-message latency or queue depth trend
+upward beyond the configured thresholds, if the queue backs up, or if
+payments are not processed successfully again soon after a restart.
+
+Run directly:
+    python tests/integration/soak.py --duration 14400
+or through pytest (tests/integration/test_e2e_processing.py) with
+SOAK_DURATION_SECONDS set.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+import pika
+from prometheus_client.parser import text_string_to_metric_families
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+QUEUE = os.getenv("PAYMENT_INITIATION_QUEUE", "payment_initiation")
+HEALTH_POLLS_PER_SAMPLE = 10
+
+# Sample-field prefix -> gunicorn app args. Each runs with one worker, is
+# polled HEALTH_POLLS_PER_SAMPLE times per sample and has that worker's RSS,
+# fds and threads trend-checked as <prefix>_rss_mb etc.
+HEALTH_APPS = {
+    "health": ["consumer:app"],
+    "api_health": ["--chdir", "src", "api.health_metrics:app"],
+}
+
+DEFAULT_THRESHOLDS = {
+    # Least-squares slope over the post-warmup samples, per hour
+    "rss_mb_per_hour": 20.0,
+    "fds_per_hour": 10.0,
+    "threads_per_hour": 2.0,
+    "latency_seconds_per_hour": 0.5,
+    "queue_depth_per_hour": 50.0,
+    # Any post-warmup sample; a backlog this deep means the load saturates the consumer
+    "max_queue_depth": 500,
+    # After each dependency restart
+    "max_recovery_seconds": 60.0,
+    "min_recovered_throughput_ratio": 0.8,
+}
+
+
+# ---------------------------
+# Trend Analysis
+# ---------------------------
+def slope(points):
+    """Least-squares slope of [(t, value), ...]; 0 for fewer than 2 points"""
+    n = len(points)
+    if n < 2:
+        return 0.0
+    mean_t = sum(t for t, _ in points) / n
+    mean_v = sum(v for _, v in points) / n
+    var = sum((t - mean_t) ** 2 for t, _ in points)
+    if var == 0:
+        return 0.0
+    return sum((t - mean_t) * (v - mean_v) for t, v in points) / var
+
+
+def check_trends(samples, thresholds, warmup_seconds):
+    """Return a list of human-readable failures (empty when healthy)"""
+    steady = [s for s in samples if s["t"] >= warmup_seconds]
+    checks = [
+        (f"{prefix}{field}", limit_name)
+        for prefix in ["", *(f"{name}_" for name in HEALTH_APPS)]
+        for field, limit_name in (
+            ("rss_mb", "rss_mb_per_hour"),
+            ("fds", "fds_per_hour"),
+            ("threads", "threads_per_hour"),
+        )
+    ] + [
+        ("latency", "latency_seconds_per_hour"),
+        ("queue_depth", "queue_depth_per_hour"),
+    ]
+
+    failures = []
+    for field, limit_name in checks:
+        points = [(s["t"], s[field]) for s in steady if s.get(field) is not None]
+        per_hour = slope(points) * 3600
+        if per_hour > thresholds[limit_name]:
+            failures.append(
+                f"{field} grows {per_hour:.2f}/h (limit {thresholds[limit_name]}/h)"
+            )
+
+    depths = [s["queue_depth"] for s in steady if s.get("queue_depth") is not None]
+    if depths and max(depths) > thresholds["max_queue_depth"]:
+        failures.append(
+            f"queue depth reached {max(depths):.0f} (limit {thresholds['max_queue_depth']}); "
+            f"the load rate is above what the consumer drains"
+        )
+
+    for name in HEALTH_APPS:
+        errors = sum(s.get(f"{name}_errors", 0) for s in steady)
+        if errors:
+            failures.append(f"{name}: /health unreachable {errors} times")
+    return failures
+
+
+# ---------------------------
+# Process / Metrics Sampling
+# ---------------------------
+def proc_stats(pid):
+    """RSS (MB), open fds and thread count from /proc (Linux only)"""
+    stats = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                stats["rss_mb"] = int(line.split()[1]) / 1024
+            elif line.startswith("Threads:"):
+                stats["threads"] = int(line.split()[1])
+    stats["fds"] = len(os.listdir(f"/proc/{pid}/fd"))
+    return stats
+
+
+def child_pid(pid):
+    """First child of pid (the gunicorn worker that serves requests), or None"""
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # comm may contain spaces; ppid is the 2nd field after ")"
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            return int(entry)
+    return None
+
+
+def scrape(port):
+    """
+    Consumed / successful counts, unexpected-error completions (routed to
+    the DLQ), end-to-end latency histogram sum/count and the main queue depth
+    """
+    body = urllib.request.urlopen(f"http://localhost:{port}/metrics", timeout=5).read().decode()
+    result = {"consumed": 0.0, "successful": 0.0, "errors": 0.0,
+              "latency_sum": 0.0, "latency_count": 0.0, "queue_depth": None}
+    for family in text_string_to_metric_families(body):
+        for sample in family.samples:
+            if sample.name == "payment_processor_messages_consumed_total":
+                result["consumed"] += sample.value
+            elif sample.name == "payment_processor_payments_successful_total":
+                result["successful"] += sample.value
+            elif sample.name == "payment_processor_queue_messages" and sample.labels.get("queue") == QUEUE:
+                result["queue_depth"] = sample.value
+            elif sample.name == "payment_processor_end_to_end_latency_seconds_sum":
+                result["latency_sum"] += sample.value
+            elif sample.name == "payment_processor_end_to_end_latency_seconds_count":
+                result["latency_count"] += sample.value
+                if sample.labels.get("outcome") == "error":
+                    result["errors"] += sample.value
+    return result
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("", 0))
+        return s.getsockname()[1]
+
+
+# ---------------------------
+# Synthetic Load
+# ---------------------------
+class LoadGenerator:
+    """Publishes `rate` events/s, reconnecting across broker restarts"""
+
+    def __init__(self, params, queue, rate):
+        self.params = params
+        self.queue = queue
+        self.rate = rate
+        self.published = 0
+        self._stop = threading.Event()
+
+    def _event(self):
+        return {
+            "idempotency_key": f"soak-{uuid.uuid4()}",
+            "amount": round(random.uniform(1, 500), 2),
+            "currency": "USD",
+            "user_id": f"soak-user-{random.randint(1, 1000)}",
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "metadata": {"source": "soak"},
+        }
+
+    def _run(self):
+        interval = 1.0 / self.rate
+        channel = None
+        while not self._stop.is_set():
+            try:
+                if channel is None:
+                    channel = pika.BlockingConnection(self.params).channel()
+                    channel.queue_declare(queue=self.queue, durable=True)
+                channel.basic_publish(
+                    exchange="",
+                    routing_key=self.queue,
+                    body=json.dumps(self._event()),
+                    properties=pika.BasicProperties(delivery_mode=2)
+                )
+                self.published += 1
+                time.sleep(interval)
+            except pika.exceptions.AMQPError:
+                channel = None
+                time.sleep(1)
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+
+# ---------------------------
+# Harness
+# ---------------------------
+class SoakHarness:
+    def __init__(self, duration, rate=2, sample_interval=30, warmup=600,
+                 restart_services=("rabbitmq", "mongodb"), use_compose=True,
+                 thresholds=None):
+        self.duration = duration
+        self.rate = rate
+        self.sample_interval = sample_interval
+        self.warmup = min(warmup, duration / 2)
+        self.restart_services = list(restart_services) if use_compose else []
+        self.use_compose = use_compose
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self.metrics_port = free_port()
+        self.health_ports = {name: free_port() for name in HEALTH_APPS}
+
+        self.samples = []
+        self.restarts = []
+        self.failures = []
+
+    # ---------- Dependencies ----------
+
+    def _compose(self, *args):
+        subprocess.run(
+            ["docker", "compose", "-f", os.path.join(ROOT, "docker-compose.yml"), *args],
+            check=True, cwd=ROOT
+        )
+
+    def _env(self):
+        env = dict(os.environ)
+        env.setdefault("MQ_HOST", "localhost")
+        env.setdefault("DB_HOST", "localhost")
+        # api.health_metrics reads these without defaults
+        env.setdefault("MQ_PORT", "5672")
+        env.setdefault("MQ_USER", "guest")
+        env.setdefault("MQ_PASS", "guest")
+        env.setdefault("DB_PORT", "27017")
+        env.setdefault("DB_USER", "root")
+        env.setdefault("DB_PASS", "rootpassword")
+        env["SERVICE_PORT_METRICS"] = str(self.metrics_port)
+        return env
+
+    def _start_consumer(self):
+        return subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "consumer.py")],
+            env=self._env(), cwd=ROOT,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+
+    def _start_health_servers(self):
+        # One worker each so the pid that serves /health is the one sampled
+        return {
+            name: subprocess.Popen(
+                ["gunicorn", "-w", "1", "-b", f"127.0.0.1:{self.health_ports[name]}", *app],
+                env=self._env(), cwd=ROOT,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            for name, app in HEALTH_APPS.items()
+        }
+
+    # ---------- Sampling ----------
+
+    def _poll_health(self, name):
+        """Count polls that got no HTTP response (503 during a restart is an answer)"""
+        errors = 0
+        for _ in range(HEALTH_POLLS_PER_SAMPLE):
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{self.health_ports[name]}/health", timeout=5).read()
+            except urllib.error.HTTPError:
+                pass
+            except OSError:
+                errors += 1
+        return errors
+
+    def _sample(self, started, pid, health_pids, previous):
+        stats = proc_stats(pid)
+        metrics = scrape(self.metrics_port)
+
+        for name, health_pid in health_pids.items():
+            stats[f"{name}_errors"] = self._poll_health(name)
+            worker = child_pid(health_pid)
+            if worker is not None:
+                stats.update({f"{name}_{k}": v for k, v in proc_stats(worker).items()})
+
+        latency = None
+        if previous is not None:
+            count = metrics["latency_count"] - previous["latency_count"]
+            if count > 0:
+                latency = (metrics["latency_sum"] - previous["latency_sum"]) / count
+
+        sample = dict(stats, t=time.time() - started, latency=latency, **metrics)
+        self.samples.append(sample)
+        return sample
+
+    def _throughput(self, since_t, until_t):
+        window = [s for s in self.samples if since_t <= s["t"] <= until_t]
+        if len(window) < 2:
+            return None
+        elapsed = window[-1]["t"] - window[0]["t"]
+        return (window[-1]["successful"] - window[0]["successful"]) / elapsed if elapsed else None
+
+    def _errors(self, since_t, until_t):
+        window = [s for s in self.samples if since_t <= s["t"] <= until_t]
+        return window[-1]["errors"] - window[0]["errors"] if len(window) >= 2 else 0
+
+    def _check_restarts(self):
+        window = max(self.sample_interval * 4, 120)
+        for service, at, recovered_at in self.restarts:
+            if recovered_at is None:
+                self.failures.append(f"{service}: payments never succeeded again after restart")
+                continue
+            # Messages that hit the outage and went to the DLQ instead of retrying
+            errors = self._errors(at - self.sample_interval, recovered_at + window)
+            if errors:
+                self.failures.append(
+                    f"{service}: {errors:.0f} messages sent to the DLQ during the restart"
+                )
+            recovery = recovered_at - at
+            if recovery > self.thresholds["max_recovery_seconds"]:
+                self.failures.append(
+                    f"{service}: recovery took {recovery:.0f}s "
+                    f"(limit {self.thresholds['max_recovery_seconds']}s)"
+                )
+            before = self._throughput(at - window, at)
+            after = self._throughput(recovered_at, recovered_at + window)
+            if before and after is not None:
+                ratio = after / before
+                if ratio < self.thresholds["min_recovered_throughput_ratio"]:
+                    self.failures.append(
+                        f"{service}: throughput after restart at {ratio:.0%} of before"
+                    )
+
+    # ---------- Run ----------
+
+    def run(self):
+        if self.use_compose:
+            self._compose("up", "-d", "rabbitmq", "mongodb")
+
+        consumer = self._start_consumer()
+        health = self._start_health_servers()
+        params = pika.ConnectionParameters(
+            host=self._env()["MQ_HOST"],
+            credentials=pika.PlainCredentials(
+                os.getenv("MQ_USER", "guest"), os.getenv("MQ_PASS", "guest")
+            )
+        )
+        load = LoadGenerator(params, QUEUE, self.rate)
+
+        # Restarts spread evenly through the post-warmup part of the run
+        span = self.duration - self.warmup
+        pending_restarts = [
+            (self.warmup + span * (i + 1) / (len(self.restart_services) + 1), service)
+            for i, service in enumerate(self.restart_services)
+        ]
+
+        started = time.time()
+        previous = None
+        waiting_recovery = None
+        try:
+            time.sleep(10)  # let the consumer connect and bind its metrics port
+            load.start()
+
+            while time.time() - started < self.duration:
+                if consumer.poll() is not None:
+                    self.failures.append(f"consumer exited with code {consumer.returncode}")
+                    break
+                exited = [name for name, p in health.items() if p.poll() is not None]
+                if exited:
+                    self.failures += [
+                        f"{name} server exited with code {health[name].returncode}" for name in exited
+                    ]
+                    break
+
+                try:
+                    sample = self._sample(
+                        started, consumer.pid, {name: p.pid for name, p in health.items()}, previous
+                    )
+                except OSError:
+                    sample = None  # metrics endpoint briefly unreachable
+
+                if sample is not None:
+                    if waiting_recovery and previous and sample["successful"] > previous["successful"]:
+                        service, at = waiting_recovery
+                        self.restarts.append((service, at, sample["t"]))
+                        waiting_recovery = None
+                    previous = sample
+
+                if pending_restarts and time.time() - started >= pending_restarts[0][0]:
+                    _, service = pending_restarts.pop(0)
+                    if waiting_recovery:
+                        self.restarts.append((*waiting_recovery, None))
+                    self._compose("restart", service)
+                    waiting_recovery = (service, time.time() - started)
+
+                time.sleep(self.sample_interval)
+        finally:
+            load.stop()
+            for process in (consumer, *health.values()):
+                process.terminate()
+                process.wait(timeout=30)
+
+        if waiting_recovery:
+            self.restarts.append((*waiting_recovery, None))
+
+        self.failures += check_trends(self.samples, self.thresholds, self.warmup)
+        self._check_restarts()
+        return self.failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak-test consumer.py for leaks and degradation")
+    parser.add_argument("--duration", type=float, default=4 * 3600, help="seconds")
+    parser.add_argument("--rate", type=float, default=2,
+                        help="events per second; keep well below consumer capacity (~10/s per lane consumer)")
+    parser.add_argument("--sample-interval", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=600)
+    parser.add_argument("--no-compose", action="store_true",
+                        help="use already running RabbitMQ/MongoDB stand-ins (no restarts)")
+    parser.add_argument("--report", help="write samples and failures as JSON here")
+    args = parser.parse_args()
+
+    harness = SoakHarness(
+        args.duration, args.rate, args.sample_interval, args.warmup,
+        use_compose=not args.no_compose
+    )
+    failures = harness.run()
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"samples": harness.samples, "restarts": harness.restarts,
+                       "failures": failures}, f, indent=2)
+
+    for failure in failures:
+        print(f"[X] {failure}")
+    print("[✓] Soak passed" if not failures else f"[X] Soak failed ({len(failures)} issues)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import os
+import pytest
+
+
+# Hours-long; opt in with SOAK_DURATION_SECONDS (needs docker compose + Linux /proc)
+@pytest.mark.skipif(
+    not os.getenv("SOAK_DURATION_SECONDS"),
+    reason="set SOAK_DURATION_SECONDS to run the soak test"
+)
+def test_soak_no_leaks_or_degradation():
+    from soak import SoakHarness
+
+    harness = SoakHarness(
+        duration=float(os.environ["SOAK_DURATION_SECONDS"]),
+        rate=float(os.getenv("SOAK_RATE", 2))
+    )
+    failures = harness.run()
+
+    assert not failures, "\n".join(failures)
+
+
+# Minutes-long; opt in with LANE_SATURATION_SECONDS (seconds per phase, needs docker compose)
+@pytest.mark.skipif(
+    not os.getenv("LANE_SATURATION_SECONDS"),
+    reason="set LANE_SATURATION_SECONDS to run the lane saturation test"
+)
+def test_high_lane_p99_holds_under_default_lane_saturation():
+    from lane_saturation import run_comparison
+
+    result, failures = run_comparison(
+        float(os.environ["LANE_SATURATION_SECONDS"]),
+        flood_rate=float(os.getenv("LANE_SATURATION_FLOOD_RATE", 50))
+    )
+
+    assert not failures, f"{failures} {result}"
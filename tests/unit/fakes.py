@@ -0,0 +1,158 @@
+"""
+In-memory stand-ins for the slice of the pymongo API the repositories and
+read models use: equality / $in / $ne filters, $set / $setOnInsert / $inc
+updates, upserts, unique keys and unordered bulk_write with per-operation
+write errors.
+"""
+import copy
+from types import SimpleNamespace
+
+from pymongo import InsertOne, UpdateOne, ReplaceOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+DUPLICATE_KEY = 11000
+
+
+def _matches(doc, query):
+    for field, cond in query.items():
+        value = doc.get(field)
+        if isinstance(cond, dict) and any(k.startswith("$") for k in cond):
+            for op, arg in cond.items():
+                if op == "$in" and value not in arg:
+                    return False
+                if op == "$ne" and value == arg:
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+def _project(doc, projection):
+    if not projection:
+        return copy.deepcopy(doc)
+    fields = {k for k, v in projection.items() if v}
+    return {k: copy.deepcopy(v) for k, v in doc.items() if k in fields or (k == "_id" and projection.get("_id", 1))}
+
+
+class FakeCursor(list):
+    def sort(self, field, direction=1):
+        super().sort(key=lambda d: d.get(field), reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        return FakeCursor(self[:n])
+
+
+class FakeCollection:
+    def __init__(self, unique=()):
+        self.docs = []
+        self.unique = ("_id",) + tuple(unique)
+        self._next_id = 0
+
+    # ---------- Helpers ----------
+
+    def _check_unique(self, doc, ignore=None):
+        for field in self.unique:
+            if field not in doc:
+                continue
+            for other in self.docs:
+                if other is not ignore and other.get(field) == doc[field]:
+                    raise DuplicateKeyError(f"duplicate {field}", DUPLICATE_KEY)
+
+    def _insert(self, doc):
+        doc = copy.deepcopy(doc)
+        if "_id" not in doc:
+            self._next_id += 1
+            doc["_id"] = self._next_id
+        self._check_unique(doc)
+        self.docs.append(doc)
+        return doc["_id"]
+
+    def _update(self, query, update, upsert=False, many=False):
+        matched = [d for d in self.docs if _matches(d, query)]
+        if not many:
+            matched = matched[:1]
+        for doc in matched:
+            for field, value in update.get("$set", {}).items():
+                doc[field] = copy.deepcopy(value)
+            for field, value in update.get("$inc", {}).items():
+                doc[field] = doc.get(field, 0) + value
+        upserted_id = None
+        if not matched and upsert:
+            doc = {k: v for k, v in query.items() if not isinstance(v, dict)}
+            doc.update(update.get("$setOnInsert", {}))
+            doc.update(update.get("$set", {}))
+            doc.update(update.get("$inc", {}))
+            upserted_id = self._insert(doc)
+        return SimpleNamespace(
+            matched_count=len(matched), modified_count=len(matched), upserted_id=upserted_id
+        )
+
+    # ---------- pymongo API ----------
+
+    def create_index(self, *args, **kwargs):
+        return "fake_index"
+
+    def find(self, query=None, projection=None):
+        return FakeCursor(_project(d, projection) for d in self.docs if _matches(d, query or {}))
+
+    def find_one(self, query=None, projection=None):
+        found = self.find(query, projection)
+        return found[0] if found else None
+
+    def count_documents(self, query):
+        return len(self.find(query))
+
+    def insert_one(self, doc):
+        doc["_id"] = self._insert(doc)
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    def update_one(self, query, update, upsert=False):
+        return self._update(query, update, upsert)
+
+    def update_many(self, query, update):
+        return self._update(query, update, many=True)
+
+    def replace_one(self, query, doc, upsert=False):
+        for i, existing in enumerate(self.docs):
+            if _matches(existing, query):
+                self.docs[i] = dict(copy.deepcopy(doc), _id=existing["_id"])
+                return SimpleNamespace(matched_count=1, upserted_id=None)
+        if upsert:
+            return SimpleNamespace(matched_count=0, upserted_id=self._insert(doc))
+        return SimpleNamespace(matched_count=0, upserted_id=None)
+
+    def bulk_write(self, ops, ordered=True):
+        matched, upserted, errors = 0, {}, []
+        for index, op in enumerate(ops):
+            try:
+                if isinstance(op, InsertOne):
+                    self._insert(op._doc)
+                elif isinstance(op, UpdateOne):
+                    result = self._update(op._filter, op._doc, op._upsert)
+                    matched += result.matched_count
+                    if result.upserted_id is not None:
+                        upserted[index] = result.upserted_id
+                elif isinstance(op, ReplaceOne):
+                    result = self.replace_one(op._filter, op._doc, op._upsert)
+                    matched += result.matched_count
+                    if result.upserted_id is not None:
+                        upserted[index] = result.upserted_id
+            except DuplicateKeyError:
+                op_doc = op._doc if isinstance(op, InsertOne) else op._filter
+                errors.append({"index": index, "code": DUPLICATE_KEY, "op": op_doc})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({
+                "writeErrors": errors,
+                "nMatched": matched,
+                "upserted": [{"index": i, "_id": _id} for i, _id in upserted.items()],
+            })
+        return SimpleNamespace(matched_count=matched, upserted_ids=upserted)
+
+
+class FakeDB(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
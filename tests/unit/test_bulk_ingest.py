@@ -0,0 +1,241 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+# ---------------- PATH FIX ----------------
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+sys.path.append(os.path.join(ROOT, "src"))
+sys.path.append(ROOT)
+
+pytest.importorskip("pymongo")
+
+from fakes import FakeCollection, FakeDB
+from repository.batching_repo import BatchingPaymentRepository
+from models.payment_aggregates import PaymentAggregates, BatchedAggregates
+from models.payment_outbox import PaymentOutbox, BatchedOutbox, PENDING, ORPHANED
+
+
+class BaseRepo:
+    """PaymentRepository over a fake collection"""
+
+    def __init__(self):
+        self.collection = FakeCollection(unique=("idempotency_key",))
+
+    def find_by_idempotency_key(self, key):
+        return self.collection.find_one({"idempotency_key": key})
+
+
+def txn(key, status="PROCESSING"):
+    return {
+        "idempotency_key": key,
+        "amount": 10.0,
+        "currency": "USD",
+        "user_id": "user-a",
+        "status": status,
+        "created_at": datetime(2024, 1, 1, 10),
+        "updated_at": datetime(2024, 1, 1, 10),
+    }
+
+
+@pytest.fixture
+def base():
+    return BaseRepo()
+
+
+def status_of(base, key):
+    return base.find_by_idempotency_key(key)["status"]
+
+
+# ---------------- BatchingPaymentRepository ----------------
+
+def test_flush_writes_inserts_and_conditional_updates(base):
+    base.collection.insert_one(txn("existing"))
+    repo = BatchingPaymentRepository(base)
+    repo.preload(["existing", "new"])
+
+    assert repo.find_by_idempotency_key("new") is None
+    assert repo.create_transaction(txn("new"))
+    assert repo.transition_status("new", "PROCESSING", {"status": "COMPLETED"})
+    assert repo.transition_status("existing", "PROCESSING", {"status": "FAILED"})
+    # Cached status already moved on: a second transition from PROCESSING loses
+    assert not repo.transition_status("existing", "PROCESSING", {"status": "COMPLETED"})
+
+    assert repo.flush() == {}
+    assert status_of(base, "new") == "COMPLETED"
+    assert status_of(base, "existing") == "FAILED"
+
+
+def test_flush_does_not_overwrite_concurrent_transition(base):
+    base.collection.insert_one(txn("raced"))
+    base.collection.insert_one(txn("quiet"))
+    repo = BatchingPaymentRepository(base)
+    repo.preload(["raced", "quiet"])
+
+    repo.transition_status("raced", "PROCESSING", {"status": "FAILED"})
+    repo.transition_status("quiet", "PROCESSING", {"status": "COMPLETED"})
+    # A live consumer completes the key between preload and flush
+    base.collection.update_one({"idempotency_key": "raced"}, {"$set": {"status": "COMPLETED"}})
+
+    assert repo.flush() == {"raced": "COMPLETED"}
+    assert status_of(base, "raced") == "COMPLETED"
+    assert status_of(base, "quiet") == "COMPLETED"
+
+
+def test_flush_reports_duplicate_inserts(base):
+    repo = BatchingPaymentRepository(base)
+    repo.preload(["dup"])
+    repo.create_transaction(txn("dup"))
+    repo.transition_status("dup", "PROCESSING", {"status": "FAILED"})
+    base.collection.insert_one(txn("dup", status="COMPLETED"))
+
+    assert repo.flush() == {"dup": "COMPLETED"}
+    assert status_of(base, "dup") == "COMPLETED"
+
+
+def test_flush_resets_batch_state(base):
+    base.collection.insert_one(txn("k"))
+    repo = BatchingPaymentRepository(base)
+    repo.preload(["k"])
+    repo.transition_status("k", "PROCESSING", {"status": "RETRYING"})
+    repo.flush()
+
+    # The next batch reloads the key and filters on its new status
+    repo.preload(["k"])
+    assert repo.find_by_idempotency_key("k")["status"] == "RETRYING"
+    repo.transition_status("k", "RETRYING", {"status": "COMPLETED"})
+    assert repo.flush() == {}
+    assert status_of(base, "k") == "COMPLETED"
+
+
+# ---------------- Dropping side effects of lost writes ----------------
+
+def test_lost_keys_are_dropped_from_aggregates_and_outbox(base):
+    db = FakeDB()
+    aggregates = BatchedAggregates(PaymentAggregates(db))
+    outbox = BatchedOutbox(PaymentOutbox(db))
+    base.collection.insert_one(txn("raced"))
+    base.collection.insert_one(txn("quiet"))
+    repo = BatchingPaymentRepository(base)
+    repo.preload(["raced", "quiet"])
+
+    for key in ("raced", "quiet"):
+        doc = repo.find_by_idempotency_key(key)
+        outbox.add(doc, "FAILED", "Invalid card details")
+        repo.transition_status(key, "PROCESSING", {"status": "FAILED"})
+        aggregates.record_transition(doc, "PROCESSING", "FAILED")
+    base.collection.update_one({"idempotency_key": "raced"}, {"$set": {"status": "COMPLETED"}})
+
+    outbox.flush()
+    conflicts = repo.flush()
+    aggregates.discard(conflicts)
+    assert outbox.retract(conflicts) == 1
+    aggregates.flush()
+
+    entries = {e["_id"]: e["state"] for e in db["payment_outbox"].find()}
+    assert entries == {"raced:FAILED": ORPHANED, "quiet:FAILED": PENDING}
+    failed = db["payment_aggregates"].find_one({"dimension": "user", "status": "FAILED"})
+    assert failed["count"] == 1
+
+
+def test_retract_keeps_entries_matching_the_winner(base):
+    db = FakeDB()
+    outbox = BatchedOutbox(PaymentOutbox(db))
+    outbox.add(txn("k"), "COMPLETED")
+    outbox.flush()
+
+    # The live consumer reached the same status: the entry announces it
+    assert outbox.retract({"k": "COMPLETED"}) == 0
+    assert db["payment_outbox"].find_one({"_id": "k:COMPLETED"})["state"] == PENDING
+
+
+def test_batched_aggregates_discard():
+    aggregates = PaymentAggregates(FakeDB())
+    batched = BatchedAggregates(aggregates)
+    batched.record_transition(txn("a"), None, "PROCESSING")
+    batched.record_transition(txn("b"), None, "PROCESSING")
+    batched.discard(["a"])
+    batched.flush()
+
+    doc = aggregates.collection.find_one({"dimension": "currency", "status": "PROCESSING"})
+    assert doc["count"] == 1
+
+
+# ---------------- replay_events ----------------
+
+@pytest.fixture
+def replay():
+    pytest.importorskip("prometheus_client")
+    import replay_events
+    return replay_events
+
+
+@pytest.fixture
+def sleeps(replay, monkeypatch):
+    calls = []
+    monkeypatch.setattr(replay.time, "sleep", calls.append)
+    return calls
+
+
+class FlakyService:
+    def __init__(self, errors):
+        self.errors = list(errors)
+
+    def process_payment(self, event):
+        if self.errors:
+            raise self.errors.pop(0)
+        return "SUCCESS"
+
+
+def test_process_one_backs_off_exponentially(replay, sleeps):
+    service = FlakyService([replay.TransientError("gateway")] * 2)
+
+    assert replay.process_one(service, None, retry_delay=0.5) == "SUCCESS"
+    assert sleeps == [0.5, 1.0]
+
+
+def test_process_one_exhausts_retries_and_fails_permanently(replay, sleeps):
+    exhausted = FlakyService([replay.TransientError("gateway")] * (replay.MAX_RETRIES + 1))
+    assert replay.process_one(exhausted, None, retry_delay=1) == "RETRIES_EXHAUSTED"
+    # No sleep after the last attempt
+    assert len(sleeps) == replay.MAX_RETRIES
+
+    assert replay.process_one(FlakyService([replay.PermanentError("card")]), None) == "FAILED"
+
+
+def test_decode_batch_rejects_invalid_and_dedupes(replay):
+    good = '{"idempotency_key": "k1", "amount": 5, "currency": "USD", "user_id": "u"}'
+    stats, rejects = replay.Counter(), []
+
+    events, raw = replay.decode_batch([good + "\n", "{broken\n", good, "\n"], stats, rejects)
+
+    assert [e.idempotency_key for e in events] == ["k1"]
+    assert raw == {"k1": good}
+    assert stats == {"INVALID": 1, "IDEMPOTENT_SKIP": 1}
+    assert rejects[0]["reason"] == "INVALID"
+    assert rejects[0]["line"] == "{broken"
+
+
+def test_read_batches_resumes_after_offset(replay):
+    lines = [f"{i}\n" for i in range(1, 8)]
+
+    assert list(replay.read_batches(lines, 3, 0)) == [
+        (3, ["1\n", "2\n", "3\n"]), (6, ["4\n", "5\n", "6\n"]), (7, ["7\n"])
+    ]
+    assert list(replay.read_batches(lines, 3, 5)) == [(7, ["6\n", "7\n"])]
+
+
+def test_checkpoint_and_rejects_files(replay, tmp_path):
+    checkpoint = str(tmp_path / "events.checkpoint")
+    rejects = str(tmp_path / "events.rejects.jsonl")
+
+    assert replay.read_checkpoint(checkpoint) == 0
+    replay.write_checkpoint(checkpoint, 1500)
+    assert replay.read_checkpoint(checkpoint) == 1500
+
+    replay.write_rejects(rejects, [{"reason": "FAILED", "line": "a"}])
+    replay.write_rejects(rejects, [])
+    replay.write_rejects(rejects, [{"reason": "INVALID", "line": "b"}])
+    with open(rejects) as f:
+        assert [replay.json.loads(l)["line"] for l in f] == ["a", "b"]
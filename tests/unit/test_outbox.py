@@ -0,0 +1,148 @@
+import os
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+# ---------------- PATH FIX ----------------
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+sys.path.append(os.path.join(ROOT, "src"))
+sys.path.append(ROOT)
+
+pytest.importorskip("pymongo")
+
+from fakes import FakeCollection, FakeDB
+from models.payment_outbox import (
+    PaymentOutbox, BatchedOutbox, PENDING, PUBLISHED, ORPHANED, outbox_entry
+)
+
+TXN = {"idempotency_key": "pay-001", "amount": 10.0, "currency": "USD", "user_id": "user-a"}
+
+
+def state(outbox, _id):
+    return outbox.collection.find_one({"_id": _id})["state"]
+
+
+# ---------------- PaymentOutbox / BatchedOutbox ----------------
+
+def test_add_never_republishes_a_published_entry():
+    outbox = PaymentOutbox(FakeDB())
+    outbox.add(TXN, "FAILED", "Invalid card details")
+    outbox.mark(["pay-001:FAILED"], PUBLISHED)
+    published_at = outbox.collection.find_one({"_id": "pay-001:FAILED"})["created_at"]
+
+    # FAILED -> FAILED on reprocessing
+    outbox.add(TXN, "FAILED", "Invalid card details")
+
+    doc = outbox.collection.find_one({"_id": "pay-001:FAILED"})
+    assert doc["state"] == PUBLISHED
+    assert doc["created_at"] == published_at
+    assert outbox.pending_count() == 0
+
+
+def test_add_rearms_an_orphaned_entry():
+    outbox = PaymentOutbox(FakeDB())
+    outbox.add(TXN, "COMPLETED")
+    outbox.mark(["pay-001:COMPLETED"], ORPHANED)
+
+    outbox.add(TXN, "COMPLETED")
+
+    assert state(outbox, "pay-001:COMPLETED") == PENDING
+
+
+def test_batched_flush_skips_published_entries():
+    outbox = PaymentOutbox(FakeDB())
+    outbox.add(TXN, "FAILED")
+    outbox.mark(["pay-001:FAILED"], PUBLISHED)
+
+    batched = BatchedOutbox(outbox)
+    batched.add(TXN, "FAILED")
+    batched.add(dict(TXN, idempotency_key="pay-002"), "COMPLETED")
+    assert batched.flush() == 2
+
+    assert state(outbox, "pay-001:FAILED") == PUBLISHED
+    assert state(outbox, "pay-002:COMPLETED") == PENDING
+
+
+# ---------------- outbox_relay ----------------
+
+@pytest.fixture
+def relay():
+    pytest.importorskip("pika")
+    pytest.importorskip("prometheus_client")
+    import outbox_relay
+    return outbox_relay
+
+
+def entry(key, status, age_seconds=0):
+    e = outbox_entry(dict(TXN, idempotency_key=key), status)
+    e["created_at"] = datetime.utcnow() - timedelta(seconds=age_seconds)
+    return e
+
+
+def transactions(*docs):
+    collection = FakeCollection(unique=("idempotency_key",))
+    for key, status, updated_at in docs:
+        collection.insert_one({"idempotency_key": key, "status": status, "updated_at": updated_at})
+    return collection
+
+
+def test_split_confirmed(relay):
+    now = datetime.utcnow()
+    later = now + timedelta(seconds=1)
+    grace = relay.ORPHAN_GRACE + 1
+    entries = [
+        entry("landed", "COMPLETED"),
+        entry("in-flight", "COMPLETED"),                   # update not written yet
+        entry("other-status", "FAILED"),                   # later RETRYING write
+        entry("lost", "FAILED", age_seconds=grace),        # update never landed
+        entry("missing", "COMPLETED", age_seconds=grace),  # no transaction at all
+    ]
+    txns = transactions(
+        ("landed", "COMPLETED", later),
+        ("in-flight", "PROCESSING", now - timedelta(seconds=5)),
+        ("other-status", "RETRYING", later),
+        ("lost", "RETRYING", later),
+    )
+
+    confirmed, orphaned = relay.split_confirmed(txns, entries)
+
+    assert [e["_id"] for e in confirmed] == ["landed:COMPLETED"]
+    assert [e["_id"] for e in orphaned] == ["lost:FAILED", "missing:COMPLETED"]
+
+
+def test_split_confirmed_needs_update_after_entry(relay):
+    # Right status, but from an earlier write than the entry
+    e = entry("k", "COMPLETED")
+    txns = transactions(("k", "COMPLETED", e["created_at"] - timedelta(seconds=1)))
+
+    assert relay.split_confirmed(txns, [e]) == ([], [])
+
+
+class FakeChannel:
+    def __init__(self):
+        self.published = []
+        self.commits = 0
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.published.append((routing_key, properties.message_id))
+
+    def tx_commit(self):
+        self.commits += 1
+
+
+def test_relay_batch_publishes_confirmed_once(relay):
+    db = FakeDB()
+    outbox = PaymentOutbox(db)
+    outbox.add(dict(TXN, idempotency_key="k"), "COMPLETED")
+    txns = transactions(("k", "COMPLETED", datetime.utcnow() + timedelta(seconds=1)))
+    channel = FakeChannel()
+
+    assert relay.relay_batch(channel, outbox, txns) == 1
+    assert channel.published == [("payment.completed", "k:COMPLETED")]
+    assert channel.commits == 1
+    assert state(outbox, "k:COMPLETED") == PUBLISHED
+
+    assert relay.relay_batch(channel, outbox, txns) == 0
+    assert len(channel.published) == 1
@@ -0,0 +1,87 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+# ---------------- PATH FIX ----------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "src"))
+
+pytest.importorskip("pymongo")
+
+from fakes import FakeDB
+from models.payment_aggregates import PaymentAggregates, BatchedAggregates, bucket_for
+
+TXN = {
+    "idempotency_key": "pay-001",
+    "user_id": "user-a",
+    "currency": "USD",
+    "amount": 25.0,
+    "created_at": datetime(2024, 1, 1, 10, 42, 7),
+}
+BUCKET = datetime(2024, 1, 1, 10)
+
+
+def totals(aggregates, status, dimension="user"):
+    doc = aggregates.collection.find_one({"dimension": dimension, "status": status})
+    return (doc["count"], doc["amount"]) if doc else None
+
+
+def test_bucket_for_truncates_to_hour():
+    assert bucket_for(TXN["created_at"]) == BUCKET
+
+
+def test_deltas_for_create():
+    deltas = list(PaymentAggregates(FakeDB()).deltas(TXN, None, "PROCESSING"))
+
+    assert [(k["dimension"], k["status"], c, a) for k, c, a in deltas] == [
+        ("user", "PROCESSING", 1, 25.0),
+        ("currency", "PROCESSING", 1, 25.0),
+    ]
+    assert deltas[0][0]["user_id"] == "user-a"
+    assert deltas[1][0]["user_id"] is None
+    assert all(k["bucket"] == BUCKET for k, _, _ in deltas)
+
+
+def test_deltas_move_between_statuses():
+    deltas = list(PaymentAggregates(FakeDB()).deltas(TXN, "PROCESSING", "COMPLETED"))
+
+    assert sorted((k["dimension"], k["status"], c, a) for k, c, a in deltas) == [
+        ("currency", "COMPLETED", 1, 25.0),
+        ("currency", "PROCESSING", -1, -25.0),
+        ("user", "COMPLETED", 1, 25.0),
+        ("user", "PROCESSING", -1, -25.0),
+    ]
+
+
+def test_record_transition_applies_inc():
+    aggregates = PaymentAggregates(FakeDB())
+    aggregates.record_transition(TXN, None, "PROCESSING")
+    aggregates.record_transition(TXN, "PROCESSING", "COMPLETED")
+    aggregates.record_transition(TXN, "COMPLETED", "COMPLETED")  # no-op
+
+    assert totals(aggregates, "PROCESSING") == (0, 0.0)
+    assert totals(aggregates, "COMPLETED") == (1, 25.0)
+    assert totals(aggregates, "COMPLETED", "currency") == (1, 25.0)
+
+
+def test_batched_aggregates_net_per_document():
+    aggregates = PaymentAggregates(FakeDB())
+    batched = BatchedAggregates(aggregates)
+    other = dict(TXN, idempotency_key="pay-002", amount=10.0)
+
+    batched.record_transition(TXN, None, "PROCESSING")
+    batched.record_transition(TXN, "PROCESSING", "RETRYING")
+    batched.record_transition(TXN, "RETRYING", "COMPLETED")
+    batched.record_transition(other, None, "PROCESSING")
+    batched.record_transition(other, "PROCESSING", "COMPLETED")
+
+    # PROCESSING and RETRYING net to zero and are not written at all
+    assert batched.flush() == 2
+    assert totals(aggregates, "PROCESSING") is None
+    assert totals(aggregates, "RETRYING") is None
+    assert totals(aggregates, "COMPLETED") == (2, 35.0)
+    assert totals(aggregates, "COMPLETED", "currency") == (2, 35.0)
+
+    # Buffer is cleared by flush
+    assert batched.flush() == 0
@@ -0,0 +1,288 @@
+import os
+import sys
+import pytest
+
+# ---------------- PATH FIX ----------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "src"))
+
+from models.payment_event import PaymentEvent, InvalidPaymentEvent
+from services.priority_router import PriorityRouter, DEFAULT_LANE
+
+
+def make_event(**overrides):
+    event = {
+        "idempotency_key": "pay-001",
+        "amount": 150.0,
+        "currency": "USD",
+        "user_id": "user_789",
+        "timestamp": "2024-01-01T00:00:00Z",
+        "metadata": {"source": "test"},
+    }
+    event.update(overrides)
+    return event
+
+
+# ---------------- PaymentEvent.from_dict ----------------
+
+def test_from_dict_valid_event():
+    event = PaymentEvent.from_dict(make_event())
+
+    assert event.idempotency_key == "pay-001"
+    assert event.amount == 150.0
+    assert event.currency == "USD"
+    assert event.user_id == "user_789"
+    assert event.timestamp == "2024-01-01T00:00:00Z"
+    assert event.metadata == {"source": "test"}
+    assert not event.simulate_transient_failure
+    assert not event.simulate_permanent_failure
+
+
+def test_from_dict_int_amount_becomes_float():
+    event = PaymentEvent.from_dict(make_event(amount=100))
+
+    assert event.amount == 100.0
+    assert isinstance(event.amount, float)
+
+
+def test_from_dict_upper_cases_currency():
+    assert PaymentEvent.from_dict(make_event(currency="eur")).currency == "EUR"
+
+
+def test_from_dict_missing_metadata_defaults_to_empty():
+    data = make_event()
+    del data["metadata"]
+
+    assert PaymentEvent.from_dict(data).metadata == {}
+
+
+def test_from_dict_reads_simulation_flags():
+    event = PaymentEvent.from_dict(make_event(metadata={
+        "simulate_transient_failure": True,
+        "simulate_permanent_failure": True,
+    }))
+
+    assert event.simulate_transient_failure
+    assert event.simulate_permanent_failure
+
+
+def test_invalid_payment_event_is_value_error():
+    # Consumers route every ValueError from decoding straight to the DLQ
+    assert issubclass(InvalidPaymentEvent, ValueError)
+
+
+@pytest.mark.parametrize("overrides", [
+    {"idempotency_key": None},
+    {"idempotency_key": ""},
+    {"idempotency_key": "-starts-with-dash"},
+    {"idempotency_key": "has space"},
+    {"idempotency_key": "k" * 129},
+    {"amount": None},
+    {"amount": True},
+    {"amount": "100"},
+    {"amount": 0},
+    {"amount": -5.0},
+    {"amount": 10 ** 9},
+    {"currency": None},
+    {"currency": "XYZ"},
+    {"currency": 840},
+    {"user_id": ""},
+    {"user_id": 42},
+    {"metadata": "not-an-object"},
+    {"metadata": ["a"]},
+])
+def test_from_dict_rejects_invalid_fields(overrides):
+    with pytest.raises(InvalidPaymentEvent):
+        PaymentEvent.from_dict(make_event(**overrides))
+
+
+@pytest.mark.parametrize("data", [None, [], "event", 1])
+def test_from_dict_rejects_non_objects(data):
+    with pytest.raises(InvalidPaymentEvent):
+        PaymentEvent.from_dict(data)
+
+
+def test_to_document_has_status_and_fields():
+    doc = PaymentEvent.from_dict(make_event()).to_document("PROCESSING")
+
+    assert doc["status"] == "PROCESSING"
+    assert doc["idempotency_key"] == "pay-001"
+    assert doc["retry_count"] == 0
+    assert doc["created_at"] == doc["updated_at"]
+
+
+# ---------------- PriorityRouter ----------------
+
+def test_router_default_rules():
+    router = PriorityRouter("payment_initiation")
+
+    assert router.lane_for(PaymentEvent.from_dict(make_event(amount=1000))) == "high"
+    assert router.lane_for(PaymentEvent.from_dict(make_event(metadata={"priority": "high"}))) == "high"
+    assert router.lane_for(PaymentEvent.from_dict(make_event(amount=999.99))) == DEFAULT_LANE
+
+
+def test_router_queue_naming():
+    router = PriorityRouter("payment_initiation")
+
+    # The default lane keeps the original queue so existing publishers keep working
+    assert router.queue_for(DEFAULT_LANE) == "payment_initiation"
+    assert router.queue_for("high") == "payment_initiation.high"
+    assert router.route(PaymentEvent.from_dict(make_event(amount=5000))) == "payment_initiation.high"
+
+
+def test_router_first_matching_rule_wins():
+    router = PriorityRouter("q", rules=[
+        {"lane": "eur", "currency": "eur"},
+        {"lane": "big", "min_amount": 100},
+        {"lane": "small", "max_amount": 10, "metadata": {"tier": "gold"}},
+    ])
+
+    assert router.lane_for(PaymentEvent.from_dict(make_event(currency="EUR", amount=500))) == "eur"
+    assert router.lane_for(PaymentEvent.from_dict(make_event(amount=500))) == "big"
+    assert router.lane_for(PaymentEvent.from_dict(make_event(amount=5, metadata={"tier": "gold"}))) == "small"
+    assert router.lane_for(PaymentEvent.from_dict(make_event(amount=5))) == DEFAULT_LANE
+
+
+def test_router_empty_rules_route_everything_to_default():
+    router = PriorityRouter("q", rules=[])
+
+    assert router.route(PaymentEvent.from_dict(make_event(amount=10 ** 5))) == "q"
+
+
+def test_router_lane_consumers_cover_every_lane():
+    router = PriorityRouter("q", rules=[{"lane": "vip", "min_amount": 1}], lane_consumers={"vip": 3})
+
+    assert router.lane_consumers == {"vip": 3, DEFAULT_LANE: 1}
+    assert set(router.lanes()) == {"vip", DEFAULT_LANE}
+
+
+def test_router_from_env(monkeypatch):
+    monkeypatch.setenv("PAYMENT_PRIORITY_RULES", '[{"lane": "eur", "currency": ["EUR"]}]')
+    monkeypatch.setenv("PAYMENT_LANE_CONSUMERS", '{"eur": 2}')
+    router = PriorityRouter.from_env("q")
+
+    assert router.route(PaymentEvent.from_dict(make_event(currency="EUR"))) == "q.eur"
+    assert router.lane_consumers == {"eur": 2, DEFAULT_LANE: 1}
+
+
+# ---------------- Retry delay queues ----------------
+
+class FakeChannel:
+    def __init__(self):
+        self.declared = {}
+        self.published = []
+
+    def queue_declare(self, queue, durable=False, arguments=None):
+        self.declared[queue] = arguments
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.published.append((exchange, routing_key, body, properties))
+
+
+def test_retry_delay_queue_dead_letters_back_to_lane():
+    pytest.importorskip("pika")
+    from services.retry_delay import declare_retry_queue, publish_retry
+
+    channel = FakeChannel()
+    name = declare_retry_queue(channel, "payment_initiation.high", 4)
+    publish_retry(channel, "payment_initiation.high", 4, b"{}", {"x-retry-count": 2})
+
+    assert name == "payment_initiation.high.retry.4s"
+    assert channel.declared[name] == {
+        "x-message-ttl": 4000,
+        "x-dead-letter-exchange": "",
+        "x-dead-letter-routing-key": "payment_initiation.high",
+    }
+    exchange, routing_key, _, properties = channel.published[0]
+    assert (exchange, routing_key) == ("", name)
+    assert properties.headers == {"x-retry-count": 2}
+
+
+def test_undecodable_bodies_raise_value_error():
+    # consumer.py, MQConsumer and dlq_retry.py all catch ValueError around
+    # PaymentEvent.from_dict(json.loads(body)); every bad body must land there
+    import json
+
+    for body in (b"\xff\xfe not utf-8", b"{not json", b"[]", b'{"amount": 1}'):
+        with pytest.raises(ValueError):
+            PaymentEvent.from_dict(json.loads(body))
+
+
+# ---------------- PaymentService ----------------
+
+class FakeRepo:
+    def __init__(self):
+        self.docs = {}
+
+    def find_by_idempotency_key(self, key):
+        doc = self.docs.get(key)
+        return dict(doc) if doc else None
+
+    def create_transaction(self, transaction):
+        if transaction["idempotency_key"] in self.docs:
+            return False
+        self.docs[transaction["idempotency_key"]] = dict(transaction)
+        return True
+
+    def transition_status(self, key, old_status, updates):
+        doc = self.docs[key]
+        if doc["status"] != old_status:
+            return False
+        doc.update(updates)
+        return True
+
+
+class BrokenAggregates:
+    def record_transition(self, txn, old_status, new_status):
+        raise RuntimeError("aggregates unavailable")
+
+
+@pytest.fixture
+def service_module(monkeypatch):
+    pytest.importorskip("prometheus_client")
+    from services import payment_service
+
+    monkeypatch.setattr(payment_service.time, "sleep", lambda _: None)
+    monkeypatch.setattr(payment_service.random, "random", lambda: 0.99)
+    return payment_service
+
+
+def test_aggregates_failure_does_not_fail_payment(service_module):
+    repo = FakeRepo()
+    service = service_module.PaymentService(repo, BrokenAggregates())
+
+    assert service.process_payment(PaymentEvent.from_dict(make_event())) == "SUCCESS"
+    assert repo.docs["pay-001"]["status"] == "COMPLETED"
+
+
+class RecordingOutbox:
+    def __init__(self):
+        self.added = []
+
+    def add(self, txn, status, error=None):
+        self.added.append((txn["idempotency_key"], status, error))
+
+
+def test_fail_payment_moves_retrying_to_failed_with_outbox(service_module):
+    repo, outbox = FakeRepo(), RecordingOutbox()
+    service = service_module.PaymentService(repo, outbox=outbox)
+    event = PaymentEvent.from_dict(make_event())
+    repo.create_transaction(dict(event.to_document("RETRYING"), retry_count=3))
+
+    assert service.fail_payment(event, "Retries exhausted")
+    assert repo.docs["pay-001"]["status"] == "FAILED"
+    assert outbox.added == [("pay-001", "FAILED", "Retries exhausted")]
+
+    # Already terminal: nothing more to announce
+    assert not service.fail_payment(event, "Retries exhausted")
+    assert len(outbox.added) == 1
+
+
+def test_fail_payment_leaves_completed_alone(service_module):
+    repo, outbox = FakeRepo(), RecordingOutbox()
+    service = service_module.PaymentService(repo, outbox=outbox)
+    event = PaymentEvent.from_dict(make_event())
+    repo.create_transaction(event.to_document("COMPLETED"))
+
+    assert not service.fail_payment(event, "Retries exhausted")
+    assert repo.docs["pay-001"]["status"] == "COMPLETED"
+    assert outbox.added == []
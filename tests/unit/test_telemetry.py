@@ -0,0 +1,115 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+# ---------------- PATH FIX ----------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "src"))
+
+pytest.importorskip("pika")
+pytest.importorskip("prometheus_client")
+
+from metrics import REGISTRY
+from telemetry import PipelineTelemetry, parse_event_timestamp
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeChannel:
+    """Answers passive declares from {queue: (message_count, consumer_count)}"""
+
+    def __init__(self, queues):
+        self.queues = queues
+
+    def queue_declare(self, queue, passive=False):
+        messages, consumers = self.queues[queue]
+        return SimpleNamespace(
+            method=SimpleNamespace(message_count=messages, consumer_count=consumers)
+        )
+
+
+def make_telemetry(queues, consumed, observed=(), local_consumers=None):
+    clock = FakeClock()
+    telemetry = PipelineTelemetry(
+        None, consumed, observed, clock=clock, local_consumers=local_consumers
+    )
+    channel = FakeChannel(queues)
+    telemetry._open_channel = lambda: channel
+    return telemetry, clock
+
+
+def gauge(name, queue):
+    return REGISTRY.get_sample_value(name, {"queue": queue})
+
+
+def test_sample_depth_and_local_drain_time():
+    telemetry, clock = make_telemetry({"t.q1": (300, 1)}, ["t.q1"])
+
+    telemetry.sample()  # first sample: depth only, no rate yet
+    assert gauge("payment_processor_queue_messages", "t.q1") == 300
+    assert gauge("payment_processor_estimated_drain_seconds", "t.q1") is None
+
+    for _ in range(30):
+        telemetry.record_delivery("t.q1")
+    clock.now += 10
+    telemetry.sample()
+
+    assert gauge("payment_processor_drain_rate_per_second", "t.q1") == 3.0
+    assert gauge("payment_processor_estimated_drain_seconds", "t.q1") == 100.0
+
+
+def test_sample_scales_drain_rate_by_broker_consumers():
+    # 2 local consumers, 6 on the broker: two more replicas drain the queue too
+    telemetry, clock = make_telemetry(
+        {"t.q2": (600, 6)}, ["t.q2"], local_consumers={"t.q2": 2}
+    )
+    telemetry.sample()
+    for _ in range(20):
+        telemetry.record_delivery("t.q2")
+    clock.now += 10
+    telemetry.sample()
+
+    assert gauge("payment_processor_drain_rate_per_second", "t.q2") == 2.0
+    assert gauge("payment_processor_estimated_drain_seconds", "t.q2") == 100.0
+
+
+def test_sample_idle_and_empty_queues():
+    telemetry, clock = make_telemetry({"t.q3": (0, 1), "t.q4": (5, 1)}, ["t.q3", "t.q4"])
+    telemetry.sample()
+    clock.now += 10
+    telemetry.sample()
+
+    assert gauge("payment_processor_estimated_drain_seconds", "t.q3") == 0
+    assert gauge("payment_processor_estimated_drain_seconds", "t.q4") == float("inf")
+
+
+def test_observed_queues_get_depth_only():
+    telemetry, clock = make_telemetry({"t.q5": (0, 1), "t.dlq": (7, 0)}, ["t.q5"], ["t.dlq"])
+    telemetry.sample()
+    clock.now += 10
+    telemetry.sample()
+
+    assert gauge("payment_processor_queue_messages", "t.dlq") == 7
+    assert gauge("payment_processor_estimated_drain_seconds", "t.dlq") is None
+
+
+def test_record_delivery_exports_counter():
+    telemetry, _ = make_telemetry({}, ["t.q6"])
+    telemetry.record_delivery("t.q6")
+    telemetry.record_delivery("t.q6")
+
+    assert gauge("payment_processor_queue_deliveries_total", "t.q6") == 2
+
+
+def test_parse_event_timestamp():
+    assert parse_event_timestamp("1970-01-01T00:00:10Z") == 10.0
+    assert parse_event_timestamp("1970-01-01T00:00:10") == 10.0
+    assert parse_event_timestamp("not a date") is None
+    assert parse_event_timestamp(None) is None